@@ -0,0 +1,65 @@
+# core/conges/certificate_store.py
+"""
+Stockage des certificats médicaux adressé par contenu.
+Le fichier est copié par blocs tout en calculant son SHA-256, puis rangé sous
+<racine>/<2 premiers caractères>/<2 suivants>/<empreinte><extension>. Deux fichiers identiques
+ne sont donc stockés qu'une fois ; les références sont comptées via certificats_medicaux.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class CopyCancelled(Exception):
+    """Copie interrompue à la demande de l'utilisateur."""
+
+
+class CertificateStore:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def path_for(self, digest, extension=""):
+        return os.path.join(self.base_dir, digest[:2], digest[2:4], digest + extension.lower())
+
+    @staticmethod
+    def digest_from_path(path):
+        """Empreinte d'un fichier du magasin (None pour les anciens fichiers nommés par date)."""
+        stem = os.path.splitext(os.path.basename(path or ""))[0]
+        return stem if _DIGEST_RE.match(stem) else None
+
+    def store(self, src_path, progress=None, cancelled=None, chunk_size=CHUNK_SIZE):
+        """
+        Copie src_path dans le magasin et retourne (chemin_stocké, empreinte).
+        progress(octets_copiés, taille_totale) est appelé après chaque bloc ; si cancelled() devient vrai,
+        la copie s'arrête et lève CopyCancelled. Un fichier déjà présent n'est pas dupliqué.
+        """
+        total = os.path.getsize(src_path)
+        tmp_dir = os.path.join(self.base_dir, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha, done = hashlib.sha256(), 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        try:
+            with open(src_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                while True:
+                    if cancelled and cancelled(): raise CopyCancelled("Copie du certificat annulée.")
+                    chunk = src.read(chunk_size)
+                    if not chunk: break
+                    sha.update(chunk); dst.write(chunk); done += len(chunk)
+                    if progress: progress(done, total)
+            digest = sha.hexdigest()
+            dest_path = self.path_for(digest, os.path.splitext(src_path)[1])
+            if os.path.exists(dest_path):
+                os.remove(tmp_path) # Doublon : le fichier existant est réutilisé
+                logging.info(f"Certificat déjà présent dans le magasin : {dest_path}")
+            else:
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                os.replace(tmp_path, dest_path)
+            return dest_path, digest
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
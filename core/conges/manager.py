@@ -4,18 +4,20 @@ import sqlite3
 from tkinter import messagebox
 import logging
 import os
-import shutil
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from utils.date_utils import get_holidays_set_for_period, jours_ouvres, validate_date
+from utils.date_utils import get_holidays_set_for_period, jours_ouvres, batch_jours_ouvres, validate_date
 from utils.config_loader import CONFIG
 from db.models import Agent, Conge
+from core.conges.timeline import build_absence_timeline
+from core.conges.certificate_store import CertificateStore
 
 
 class CongeManager:
     def __init__(self, db_manager, certificats_dir):
         self.db = db_manager
         self.certificats_dir = certificats_dir
+        self.cert_store = CertificateStore(certificats_dir)
 
     # --- Les fonctions de base ne changent pas ---
     def get_all_agents(self, **kwargs):
@@ -85,36 +87,28 @@ class CongeManager:
         if not conge_to_delete: return False
         agent_id = conge_to_delete.agent_id
         try:
-            parent_conge_row = self.db.execute_query(
-                """SELECT * FROM conges 
-                   WHERE agent_id = ? AND type_conge = 'Congé annuel' AND statut = 'Annulé' 
-                   AND ( (date(date_debut) <= date(?) AND date(date_fin) >= date(?)) OR (date(date_debut) >= date(?) AND date(date_fin) <= date(?)) )
-                   ORDER BY date_debut DESC LIMIT 1""",
-                (agent_id, conge_to_delete.date_debut.strftime('%Y-%m-%d'), conge_to_delete.date_fin.strftime('%Y-%m-%d'),
-                 conge_to_delete.date_debut.strftime('%Y-%m-%d'), conge_to_delete.date_fin.strftime('%Y-%m-%d')),
-                fetch="one"
-            )
-            if parent_conge_row:
-                parent_conge = Conge.from_db_row(parent_conge_row)
+            # Candidats via l'index R*Tree (congés annulés chevauchant la période), puis test d'inclusion
+            candidats = self.db.get_leaves_in_range(conge_to_delete.date_debut, conge_to_delete.date_fin, agent_id=agent_id, statut='Annulé')
+            debut, fin = conge_to_delete.date_debut, conge_to_delete.date_fin
+            parents = [c for c in candidats if c.type_conge == 'Congé annuel' and
+                       ((c.date_debut <= debut and c.date_fin >= fin) or (c.date_debut >= debut and c.date_fin <= fin))]
+            if parents:
+                parent_conge = max(parents, key=lambda c: c.date_debut)
                 logging.info(f"Restauration détectée. Parent ID: {parent_conge.id}.")
-                self.db.conn.execute('BEGIN TRANSACTION')
-                cursor = self.db.conn.cursor()
-                self.db._supprimer_conge_no_commit(cursor, conge_id_to_delete)
-                all_active_conges = [Conge.from_db_row(r) for r in cursor.execute("SELECT * FROM conges WHERE agent_id=? AND statut='Actif'", (agent_id,)).fetchall()]
-                for conge in all_active_conges:
-                    if conge.date_debut >= parent_conge.date_debut and conge.date_fin <= parent_conge.date_fin:
-                         self.db._supprimer_conge_no_commit(cursor, conge.id)
-                cursor.execute("UPDATE conges SET statut = 'Actif' WHERE id = ?", (parent_conge.id,))
-                if parent_conge.type_conge in CONFIG['conges']['types_decompte_solde']:
-                    cursor.execute("UPDATE agents SET solde = solde - ? WHERE id = ?", (parent_conge.jours_pris, agent_id))
-                self.db.conn.commit()
+                with self.db.transaction() as cursor:
+                    self.db._supprimer_conge_no_commit(cursor, conge_id_to_delete)
+                    for conge in self.db.get_leaves_in_range(parent_conge.date_debut, parent_conge.date_fin, agent_id=agent_id):
+                        if conge.date_debut >= parent_conge.date_debut and conge.date_fin <= parent_conge.date_fin:
+                             self.db._supprimer_conge_no_commit(cursor, conge.id)
+                    cursor.execute("UPDATE conges SET statut = 'Actif' WHERE id = ?", (parent_conge.id,))
+                    if parent_conge.type_conge in CONFIG['conges']['types_decompte_solde']:
+                        self.db._mouvement_solde_no_commit(cursor, agent_id, -parent_conge.jours_pris, "Restauration congé", parent_conge.id, parent_conge.date_debut)
                 return True
             else:
                 logging.info(f"Aucun parent trouvé. Suppression simple.")
                 self.db.supprimer_conge(conge_id_to_delete)
                 return True
         except (sqlite3.Error, ValueError) as e:
-            if self.db.conn.in_transaction: self.db.conn.rollback()
             logging.error(f"Échec de la transaction: {e}", exc_info=True); raise e
 
     def handle_conge_submission(self, form_data, is_modification):
@@ -137,30 +131,33 @@ class CongeManager:
                                 justif=form_data.get('justif'), interim_id=form_data.get('interim_id'), 
                                 date_debut=start_date.strftime('%Y-%m-%d'), date_fin=end_date.strftime('%Y-%m-%d'), 
                                 jours_pris=form_data['jours_pris'])
-            if is_modification: conge_id = self.db.modifier_conge(form_data['conge_id'], conge_model)
-            else: conge_id = self.db.ajouter_conge(conge_model)
-            if conge_id and form_data['type_conge'] == "Congé de maladie":
-                 self._handle_certificat_save(form_data, is_modification, conge_id)
+            # Congé et certificat sont enregistrés dans la même unité de travail (un seul commit)
+            with self.db.transaction():
+                if is_modification: conge_id = self.db.modifier_conge(form_data['conge_id'], conge_model)
+                else: conge_id = self.db.ajouter_conge(conge_model)
+                if conge_id and form_data['type_conge'] == "Congé de maladie":
+                     self._handle_certificat_save(form_data, is_modification, conge_id)
             return True if conge_id else False
         except (ValueError, sqlite3.Error) as e:
             messagebox.showerror("Erreur de validation", str(e)); return False
         except Exception as e:
             logging.error(f"Erreur soumission congé: {e}", exc_info=True)
             messagebox.showerror("Erreur Inattendue", str(e)); return False
+        finally:
+            # Un fichier copié pour un enregistrement qui a échoué n'est référencé par personne : on le retire
+            if form_data.get('cert_stored'): self.db.purge_orphan_files([form_data['cert_stored'][0]])
 
     def split_or_replace_leaves(self, annual_overlaps, form_data):
         # ... (cette fonction ne change pas, elle est stable)
         logging.info(f"Division/Remplacement de {len(annual_overlaps)} congés annuels.")
-        try:
-            self.db.conn.execute('BEGIN TRANSACTION')
-            cursor = self.db.conn.cursor()
+        with self.db.transaction() as cursor:
             new_start = validate_date(form_data['date_debut'])
             new_end = validate_date(form_data['date_fin'])
             holidays_set = get_holidays_set_for_period(self.db, new_start.year - 1, new_end.year + 2)
             for conge in annual_overlaps:
                 cursor.execute("UPDATE conges SET statut = 'Annulé' WHERE id=?", (conge.id,))
                 if conge.type_conge in CONFIG['conges']['types_decompte_solde']:
-                    cursor.execute("UPDATE agents SET solde = solde + ? WHERE id=?", (conge.jours_pris, conge.agent_id))
+                    self.db._mouvement_solde_no_commit(cursor, conge.agent_id, conge.jours_pris, "Annulation (division)", conge.id, conge.date_debut)
                 if conge.date_debut < new_start:
                     end_part1 = new_start - timedelta(days=1)
                     self._creer_segment(cursor, conge.agent_id, conge.date_debut, end_part1, holidays_set)
@@ -174,10 +171,7 @@ class CongeManager:
             new_conge_id = self.db._ajouter_conge_no_commit(cursor, new_conge_model)
             if new_conge_id and form_data['type_conge'] == "Congé de maladie":
                 self._handle_certificat_save(form_data, False, new_conge_id)
-            self.db.conn.commit()
-            return True
-        except (sqlite3.Error, ValueError) as e:
-            self.db.conn.rollback(); raise e
+        return True
 
     def _creer_segment(self, cursor, agent_id, date_debut, date_fin, holidays_set):
         # ... (cette fonction ne change pas, elle est stable)
@@ -188,28 +182,27 @@ class CongeManager:
             self.db._ajouter_conge_no_commit(cursor, segment)
 
     def _handle_certificat_save(self, form_data, is_modification, conge_id):
-        # ... (cette fonction ne change pas, elle est stable)
+        """
+        Rattache le justificatif au congé. Le fichier est normalement déjà copié dans le magasin
+        (form_data['cert_stored'], copie en arrière-plan par le formulaire) ; sinon il est copié ici.
+        Les anciens fichiers ne sont supprimés qu'après le commit, et seulement s'ils ne sont plus référencés.
+        """
         new_path = form_data.get('cert_path')
         original_path = form_data.get('original_cert_path')
-        if not new_path or not conge_id: return
-        if os.path.exists(new_path) and new_path != original_path:
-            try:
-                filename = f"cert_{form_data['agent_ppr']}_{conge_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{os.path.splitext(new_path)[1]}"
-                dest_path = os.path.join(self.certificats_dir, filename)
-                shutil.copy(new_path, dest_path)
-                cert_model = type('Certificat', (object,), {'duree_jours': form_data['jours_pris'], 'chemin_fichier': dest_path})()
-                self.db.execute_query("REPLACE INTO certificats_medicaux (conge_id, duree_jours, chemin_fichier) VALUES (?, ?, ?)",
-                                      (conge_id, cert_model.duree_jours, cert_model.chemin_fichier))
-                if original_path and os.path.exists(original_path): os.remove(original_path)
-            except Exception as e:
-                logging.error(f"Erreur sauvegarde certificat: {e}", exc_info=True)
-                messagebox.showwarning("Erreur Certificat", f"Le congé a été sauvegardé, mais le certificat n'a pas pu être copié:\n{e}")
-        elif not new_path and original_path:
-            try:
-                self.db.execute_query("DELETE FROM certificats_medicaux WHERE conge_id = ?", (conge_id,))
-                if os.path.exists(original_path): os.remove(original_path)
-            except Exception as e:
-                logging.error(f"Impossible de supprimer l'ancien certificat pour conge_id {conge_id}: {e}")
+        if not conge_id: return
+        with self.db.transaction() as cursor:
+            if new_path and new_path == original_path:
+                # Même fichier : on le rattache au congé (une modification recrée le congé sous un nouvel ID)
+                self.db._attacher_certificat_no_commit(cursor, conge_id, form_data['jours_pris'], original_path, self.cert_store.digest_from_path(original_path))
+            elif new_path and os.path.exists(new_path):
+                stored_path, digest = form_data.get('cert_stored') or self.cert_store.store(new_path)
+                self.db._attacher_certificat_no_commit(cursor, conge_id, form_data['jours_pris'], stored_path, digest)
+            elif not new_path and original_path:
+                self.db._detacher_certificat_no_commit(cursor, conge_id)
+
+    def get_absence_timeline(self, start, end, group_by=None):
+        """Chronologie journalière des absences (voir core.conges.timeline)."""
+        return build_absence_timeline(self.db, start, end, group_by)
 
     def find_inconsistent_annual_leaves(self, year):
         """
@@ -223,22 +216,19 @@ class CongeManager:
         try:
             # 1. Récupérer tous les congés annuels actifs de l'année
             query = "SELECT * FROM conges WHERE type_conge = 'Congé annuel' AND statut = 'Actif' AND strftime('%Y', date_debut) = ?"
-            leaves_rows = self.db.execute_query(query, (str(year),), fetch="all")
+            conges = self.db.execute_query(query, (str(year),), fetch="all", row_factory=Conge.row_factory)
             
-            if not leaves_rows:
+            if not conges:
                 return []
 
             # 2. Charger l'ensemble des jours fériés pour cette période
             holidays_set = get_holidays_set_for_period(self.db, year, year)
             
-            # 3. Itérer et comparer
-            for row in leaves_rows:
-                conge = Conge.from_db_row(row)
-                
-                # Recalculer les jours ouvrés avec la liste de fériés actuelle
-                recalculated_days = jours_ouvres(conge.date_debut, conge.date_fin, holidays_set)
-                
-                # S'il y a une différence, on l'ajoute à la liste des problèmes
+            # 3. Recalculer tous les jours ouvrés en un seul lot avec la liste de fériés actuelle
+            recalculated = batch_jours_ouvres([c.date_debut for c in conges], [c.date_fin for c in conges], holidays_set)
+            
+            # 4. S'il y a une différence, on l'ajoute à la liste des problèmes
+            for conge, recalculated_days in zip(conges, recalculated):
                 if conge.jours_pris != recalculated_days:
                     inconsistent_leaves.append((conge, recalculated_days))
                     
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 import os
 
 # Import des fonctions et de la configuration depuis vos modules utilitaires
-from utils.date_utils import jours_ouvres
+from utils.date_utils import jours_ouvres, get_business_calendar
 from utils.config_loader import CONFIG
 
 class CongeStrategy(ABC):
@@ -66,14 +66,7 @@ class CongeAnnuelStrategy(CongeStrategy):
     """Stratégie pour les congés annuels, calculés en jours ouvrés."""
     def calculate_end_date(self, start_date, days_to_add, holidays_set):
         if days_to_add <= 0: return start_date
-        temp_date = start_date.date()
-        days_counted = 0
-        while days_counted < days_to_add:
-            if temp_date.weekday() < 5 and temp_date not in holidays_set:
-                days_counted += 1
-            if days_counted < days_to_add:
-                temp_date += timedelta(days=1)
-        return temp_date
+        return get_business_calendar(holidays_set).nth_working_day(start_date, days_to_add)
 
     def calculate_days(self, start_date, end_date, holidays_set):
         return jours_ouvres(start_date, end_date, holidays_set)
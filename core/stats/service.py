@@ -0,0 +1,52 @@
+# core/stats/service.py
+"""
+Statistiques globales calculées en SQL (GROUP BY) plutôt qu'en Python.
+Les résultats sont mis en cache et invalidés par l'estampille db.data_version(), commune à tous les threads.
+"""
+import threading
+from datetime import datetime
+
+
+class StatsService:
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self._cache, self._cache_version = {}, None
+        self._lock = threading.Lock() # les statistiques sont calculées dans les threads de l'exécuteur
+
+    def _cached(self, key, compute):
+        with self._lock:
+            version = self.db.data_version()
+            if self._cache_version != version:
+                self._cache, self._cache_version = {}, version
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    def get_global_stats(self, year=None):
+        """
+        Retourne un dictionnaire : nombre d'agents, total des congés actifs (nombre et jours),
+        répartition par type, par grade, et par mois pour l'année demandée (année courante par défaut).
+        """
+        year = year or datetime.now().year
+        return self._cached(('global', year), lambda: self._compute_global_stats(year))
+
+    def _compute_global_stats(self, year):
+        q = self.db.execute_query
+        # Totaux et répartitions lus dans la table de synthèse conges_summary (quelques lignes par agent)
+        par_type = q("""SELECT type_conge, SUM(count), SUM(jours) FROM conges_summary WHERE statut = 'Actif'
+                        GROUP BY type_conge ORDER BY SUM(count) DESC, type_conge""", fetch="all")
+        par_grade = q("""SELECT a.grade, SUM(s.count), SUM(s.jours) FROM conges_summary s JOIN agents a ON a.id = s.agent_id
+                         WHERE s.statut = 'Actif' GROUP BY a.grade ORDER BY SUM(s.jours) DESC, a.grade""", fetch="all")
+        # La répartition mensuelle a besoin de la date exacte : agrégat direct sur conges, borné à l'année
+        par_mois = q("""SELECT CAST(strftime('%m', date_debut) AS INTEGER), COUNT(*), SUM(jours_pris) FROM conges
+                        WHERE statut = 'Actif' AND date_debut >= ? AND date_debut < ? GROUP BY 1 ORDER BY 1""",
+                     (f"{year:04d}-01-01", f"{year + 1:04d}-01-01"), fetch="all")
+        return {
+            'nb_agents': self.db.get_agents_count(),
+            'nb_conges': sum(r[1] for r in par_type),
+            'total_jours': sum(r[2] for r in par_type),
+            'par_type': par_type,
+            'par_grade': par_grade,
+            'annee': year,
+            'par_mois': par_mois,
+        }
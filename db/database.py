@@ -3,77 +3,300 @@ import sqlite3
 from tkinter import messagebox
 import logging
 import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
 
 from db.models import Agent, Conge
+from db.migrations import apply_migrations, SUMMARY_REBUILD_DELETE, SUMMARY_REBUILD_INSERT
+from utils.date_utils import invalidate_holidays_cache, to_sql_date, parse_date
+from utils.text_utils import build_fts_query, normalize_search_text
 try:
     from utils.config_loader import CONFIG
 except ImportError:
     CONFIG = {'conges': {'types_decompte_solde': ['Congé annuel']}}
 
+# Réglages SQLite par défaut, surchargés par la section `db` de config.yaml
+DEFAULT_DB_SETTINGS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size_kb': 20000,
+    'mmap_size_mb': 256,
+    'busy_timeout_ms': 5000,
+}
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+# Tris autorisés (liste blanche) : clé -> colonnes de l'ORDER BY. L'id termine toujours l'ordre des agents, qui est
+# ainsi total : un tri décroissant inverse toutes les colonnes et la position d'un agent se compte par comparaison de tuples.
+# Textes comparés sans tenir compte de la casse (NOCASE ne replie que les lettres ASCII : une initiale accentuée
+# reste classée après « Z »). Chaque tri a un index de mêmes expressions et collations (migration 9).
+AGENT_SORT_COLUMNS = {
+    'nom': ("agents.nom COLLATE NOCASE", "agents.prenom COLLATE NOCASE"),
+    'prenom': ("agents.prenom COLLATE NOCASE", "agents.nom COLLATE NOCASE"),
+    'ppr': ("CAST(agents.ppr AS INTEGER)", "agents.ppr"), # Ordre numérique, le texte départage ('007' / '7')
+    'grade': ("agents.grade COLLATE NOCASE", "agents.nom COLLATE NOCASE", "agents.prenom COLLATE NOCASE"),
+    'solde': ("agents.solde", "agents.nom COLLATE NOCASE", "agents.prenom COLLATE NOCASE"),
+}
+CONGE_SORT_COLUMNS = {
+    'type': "c.type_conge",
+    'debut': "c.date_debut",
+    'fin': "c.date_fin",
+    'jours': "c.jours_pris",
+    'justif': "IFNULL(c.justif, '')",
+    'interim': "interim_nom",
+    'certificat': "has_cert",
+}
+
+_SORT_COLUMN_RE = re.compile(r'agents\.(\w+)')
+
+def _agent_sort(order_by, descending):
+    if order_by not in AGENT_SORT_COLUMNS: raise ValueError(f"Tri des agents non autorisé : {order_by}")
+    columns = AGENT_SORT_COLUMNS[order_by] + ("agents.id",)
+    return columns, ", ".join(f"{col} {'DESC' if descending else 'ASC'}" for col in columns)
+
+def _agent_seek(order_by, descending, key, forward):
+    """
+    Condition (sql, paramètres) « après `key` » (forward) ou « avant `key` » dans l'ordre demandé. key = valeurs brutes
+    des colonnes du tri (agent_sort_key), éventuellement tronquées ; la borne reçoit la même expression que la colonne.
+    """
+    columns = _agent_sort(order_by, descending)[0][:len(key)]
+    bounds = [_SORT_COLUMN_RE.sub("?", col, count=1) for col in columns]
+    op = '>' if forward != descending else '<'
+    if len(columns) == 1: return f"{columns[0]} {op} {bounds[0]}", list(key)
+    # La borne large sur la première colonne permet à SQLite de partir de la clé dans l'index (il ne le fait pas pour
+    # une comparaison de tuples dont les termes portent une collation ou une expression), le tuple affine ensuite.
+    return f"{columns[0]} {op}= {bounds[0]} AND ({', '.join(columns)}) {op} ({', '.join(bounds)})", [key[0], *key]
+
+def agent_sort_key(agent, order_by):
+    """Clé de tri d'un agent (valeurs brutes des colonnes du tri puis id), à passer à get_agents(after= / before=)."""
+    return tuple(getattr(agent, _SORT_COLUMN_RE.search(col).group(1)) for col in _agent_sort(order_by, False)[0])
+
+# Colonnes écrites par l'application : les colonnes *_recherche alimentent l'index agents_fts (triggers de la migration 4)
+_AGENT_WRITE_COLUMNS = "nom, prenom, ppr, grade, solde, nom_recherche, prenom_recherche, ppr_recherche"
+
+def _agent_row(nom, prenom, ppr, grade, solde):
+    """Valeurs de _AGENT_WRITE_COLUMNS : champs nettoyés puis leurs formes normalisées pour la recherche."""
+    nom, prenom, ppr, grade = nom.strip(), prenom.strip(), ppr.strip(), grade.strip()
+    return (nom, prenom, ppr, grade, solde, normalize_search_text(nom), normalize_search_text(prenom), normalize_search_text(ppr))
+
+def _ordinal(value):
+    """Ordinal d'une date (date, datetime ou chaîne), comme stocké dans l'index conges_rtree."""
+    return (value if hasattr(value, 'toordinal') else parse_date(value)).toordinal()
+
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """Verrou d'écriture non obtenu dans le délai busy_timeout : un autre traitement écrit dans la base."""
+
+
 class DatabaseManager:
-    def __init__(self, db_file):
+    """
+    Point d'accès unique à la base SQLite.
+    Le thread de l'interface lit et écrit sur self.conn. Chaque thread secondaire a sa propre connexion de
+    lecture et, s'il écrit (import), sa propre connexion d'écriture : l'interface ne voit donc que des données
+    validées et n'attend pas la fin d'un long traitement pour lire. Les écritures concurrentes sont
+    sérialisées par SQLite (BEGIN IMMEDIATE + busy_timeout) ; les traitements longs valident par lots courts
+    pour que les écritures de l'interface passent entre deux lots. Un verrou non obtenu dans le délai lève
+    DatabaseBusyError.
+    """
+    def __init__(self, db_file, settings=None):
         self.db_file = db_file
+        self.settings = {**DEFAULT_DB_SETTINGS, **(settings if settings is not None else CONFIG.get('db', {}))}
         self.conn = None
+        self._local = threading.local() # connexions et état de transaction propres à chaque thread
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._owner_thread = None
+        self._count_cache, self._count_cache_version = {}, None
+        self._count_cache_lock = threading.Lock()
+        self._version_conn = None       # connexion fixe qui ne sert qu'à lire PRAGMA data_version
+        self._write_generation = 0      # incrémenté à chaque transaction validée par ce processus
+        self._version_lock = threading.Lock()
+
+    def _open_connection(self):
+        """Ouvre une connexion et applique les pragmas de performance configurés."""
+        busy_timeout_ms = int(self.settings['busy_timeout_ms'])
+        synchronous = str(self.settings['synchronous']).upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise sqlite3.Error(f"Valeur 'synchronous' invalide dans la configuration : {synchronous}")
+        conn = sqlite3.connect(self.db_file, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {busy_timeout_ms}")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.settings['cache_size_kb'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.settings['mmap_size_mb']) * 1024 * 1024}")
+        return conn
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_file)
-            self.conn.execute("PRAGMA foreign_keys = ON")
+            journal_mode = str(self.settings['journal_mode']).upper()
+            if journal_mode not in JOURNAL_MODES:
+                raise sqlite3.Error(f"Valeur 'journal_mode' invalide dans la configuration : {journal_mode}")
+            self.conn = self._open_connection()
+            self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+            self._version_conn = self._open_connection()
+            self._version_conn.execute("PRAGMA query_only = ON")
+            with self._readers_lock: self._readers.append(self._version_conn)
+            self._owner_thread = threading.get_ident()
             return True
         except sqlite3.Error as e:
             messagebox.showerror("Erreur Base de Données", f"Impossible de se connecter : {e}")
             return False
 
+    def reader(self):
+        """
+        Connexion de lecture du thread courant. Le thread de l'interface lit sur la connexion
+        d'écriture (il voit ainsi ses propres transactions) ; les autres threads ont la leur.
+        """
+        if threading.get_ident() == self._owner_thread:
+            return self.conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+            with self._readers_lock: self._readers.append(conn)
+        return conn
+
+    def writer(self):
+        """Connexion d'écriture du thread courant : self.conn pour l'interface, une connexion dédiée ailleurs."""
+        if threading.get_ident() == self._owner_thread:
+            return self.conn
+        conn = getattr(self._local, 'writer', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.writer = conn
+            with self._readers_lock: self._readers.append(conn)
+        return conn
+
+    @property
+    def _fichiers_a_verifier(self):
+        """Certificats peut-être orphelins de la transaction du thread courant, vérifiés après son commit."""
+        if not hasattr(self._local, 'fichiers'): self._local.fichiers = []
+        return self._local.fichiers
+
     def close(self):
+        with self._readers_lock:
+            for conn in self._readers: conn.close()
+            self._readers.clear()
         if self.conn: self.conn.close()
 
-    def execute_query(self, query, params=(), fetch=None):
+    def execute_query(self, query, params=(), fetch=None, row_factory=None):
+        """
+        Exécute une requête. Une lecture passe par la connexion de lecture du thread ; une écriture
+        s'inscrit dans la transaction en cours (self.transaction()) ou est validée immédiatement.
+        """
         if not self.conn:
             raise sqlite3.Error("Pas de connexion à la base de données.")
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            if fetch == "one": return cursor.fetchone()
-            if fetch == "all": return cursor.fetchall()
-            self.conn.commit()
-            return cursor.lastrowid
+            if fetch:
+                cursor = (self.writer() if self.in_transaction() else self.reader()).cursor()
+                if row_factory: cursor.row_factory = row_factory
+                cursor.execute(query, params)
+                return cursor.fetchone() if fetch == "one" else cursor.fetchall()
+            with self.transaction() as cursor:
+                cursor.execute(query, params)
+                return cursor.lastrowid
         except sqlite3.Error as e:
-            self.conn.rollback()
             logging.error(f"Erreur SQL: {query} avec params {params} -> {e}", exc_info=True)
             raise e
 
+    @contextmanager
+    def transaction(self):
+        """
+        Unité de travail : `with db.transaction() as cursor:` valide tout à la sortie (un seul commit)
+        ou annule tout en cas d'exception. Les appels imbriqués utilisent des SAVEPOINT, de sorte que
+        les méthodes d'écriture s'inscrivent dans la transaction englobante.
+        """
+        conn, depth = self.writer(), getattr(self._local, 'tx_depth', 0)
+        if depth == 0:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e): raise
+                raise DatabaseBusyError("La base est occupée par un autre traitement (import en cours ?). Réessayez dans un instant.") from e
+        else: conn.execute(f"SAVEPOINT sp_{depth}")
+        self._local.tx_depth = depth + 1
+        try:
+            yield conn.cursor()
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0: conn.rollback(); self._fichiers_a_verifier.clear()
+            else: conn.execute(f"ROLLBACK TO sp_{depth}"); conn.execute(f"RELEASE sp_{depth}")
+            self._donnees_modifiees()
+            raise
+        self._local.tx_depth = depth
+        if depth == 0:
+            conn.commit()
+            self._donnees_modifiees()
+            fichiers, self._local.fichiers = self._fichiers_a_verifier, []
+            self.purge_orphan_files(fichiers)
+        else: conn.execute(f"RELEASE sp_{depth}")
+
+    def _donnees_modifiees(self):
+        """Après un commit ou une annulation : nouvelle estampille et cache des comptages vidé (il a pu lire des lignes annulées)."""
+        with self._version_lock: self._write_generation += 1
+        with self._count_cache_lock: self._count_cache, self._count_cache_version = {}, None
+
+    def in_transaction(self):
+        """Vrai si le thread courant a une unité de travail ouverte."""
+        return getattr(self._local, 'tx_depth', 0) > 0
+
     def create_db_tables(self):
+        """Met le schéma à jour via les migrations numérotées (aucun DDL si la base est à jour)."""
         try:
-            self.execute_query("""CREATE TABLE IF NOT EXISTS agents (id INTEGER PRIMARY KEY, nom TEXT NOT NULL, prenom TEXT, ppr TEXT UNIQUE NOT NULL, grade TEXT NOT NULL, solde REAL NOT NULL CHECK(solde >= 0))""")
-            self.execute_query("""CREATE TABLE IF NOT EXISTS conges (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_conge TEXT NOT NULL, justif TEXT, interim_id INTEGER, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL CHECK(jours_pris >= 0), statut TEXT NOT NULL DEFAULT 'Actif', FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE, FOREIGN KEY (interim_id) REFERENCES agents(id) ON DELETE SET NULL)""")
-            self.execute_query("""CREATE TABLE IF NOT EXISTS jours_feries_personnalises (date TEXT PRIMARY KEY, nom TEXT NOT NULL, type TEXT NOT NULL)""")
-            self.execute_query("""CREATE TABLE IF NOT EXISTS certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT, duree_jours INTEGER, chemin_fichier TEXT NOT NULL, FOREIGN KEY (conge_id) REFERENCES conges(id) ON DELETE CASCADE)""")
+            apply_migrations(self.conn)
+            self.refresh_solde_snapshots()
         except sqlite3.Error as e:
+            logging.error(f"Erreur lors de la migration du schéma : {e}", exc_info=True)
             messagebox.showerror("Erreur BD", f"Erreur création des tables : {e}")
 
+    # --- Solde : toute modification passe par le journal solde_mouvements, dans la même transaction ---
+
+    def _mouvement_solde_no_commit(self, cursor, agent_id, delta, motif, conge_id=None, date_mouvement=None):
+        """Mouvement daté par son événement (début du congé) ; sans date, par sa saisie."""
+        cursor.execute("UPDATE agents SET solde = solde + ? WHERE id = ?", (delta, agent_id))
+        cursor.execute("INSERT INTO solde_mouvements (agent_id, date_mouvement, delta, motif, conge_id) VALUES (?, IFNULL(?, datetime('now', 'localtime')), ?, ?, ?)",
+                       (agent_id, to_sql_date(date_mouvement) if date_mouvement else None, delta, motif, conge_id))
+
+    def _aligner_journal_solde_no_commit(self, cursor, motif, agent_id=None, pprs=None):
+        """
+        Après une saisie directe du solde (fiche agent, import), journalise l'écart entre le solde et le journal,
+        pour un agent, une liste de PPR ou tous les agents (somme du journal lue par agent sur son index).
+        """
+        c, p = [], [motif]
+        if agent_id is not None: c.append("a.id = ?"); p.append(agent_id)
+        if pprs is not None: c.append(f"a.ppr IN ({','.join('?' * len(pprs))})"); p.extend(pprs)
+        q = """INSERT INTO solde_mouvements (agent_id, delta, motif)
+               SELECT id, ecart, ? FROM (SELECT a.id, a.solde - IFNULL((SELECT SUM(m.delta) FROM solde_mouvements m WHERE m.agent_id = a.id), 0) AS ecart
+                                         FROM agents a""" + (" WHERE " + " AND ".join(c) if c else "") + """)
+               WHERE ABS(ecart) > 1e-9"""
+        cursor.execute(q, tuple(p))
+
     def _ajouter_conge_no_commit(self, cursor, conge_model):
-        if conge_model.type_conge in CONFIG['conges']['types_decompte_solde']:
+        decompte = conge_model.type_conge in CONFIG['conges']['types_decompte_solde']
+        if decompte:
             agent_data = cursor.execute("SELECT solde FROM agents WHERE id=?", (conge_model.agent_id,)).fetchone()
             if agent_data[0] < conge_model.jours_pris:
                 raise sqlite3.Error(f"Solde insuffisant ({agent_data[0]:.1f}j) pour décompter {conge_model.jours_pris}j.")
-            cursor.execute("UPDATE agents SET solde = solde - ? WHERE id = ?", (conge_model.jours_pris, conge_model.agent_id))
         
         cursor.execute("INSERT INTO conges (agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                       (conge_model.agent_id, conge_model.type_conge, conge_model.justif, conge_model.interim_id, conge_model.date_debut, conge_model.date_fin, conge_model.jours_pris))
-        return cursor.lastrowid
+                       (conge_model.agent_id, conge_model.type_conge, conge_model.justif, conge_model.interim_id, to_sql_date(conge_model.date_debut), to_sql_date(conge_model.date_fin), conge_model.jours_pris))
+        conge_id = cursor.lastrowid
+        if decompte: self._mouvement_solde_no_commit(cursor, conge_model.agent_id, -conge_model.jours_pris, "Congé", conge_id, conge_model.date_debut)
+        return conge_id
 
     def _supprimer_conge_no_commit(self, cursor, conge_id):
-        conge = cursor.execute("SELECT agent_id, type_conge, jours_pris, statut FROM conges WHERE id=?", (conge_id,)).fetchone()
+        conge = cursor.execute("SELECT agent_id, type_conge, jours_pris, statut, date_debut FROM conges WHERE id=?", (conge_id,)).fetchone()
         if not conge: return
-        agent_id, type_conge, jours_pris, statut = conge
+        agent_id, type_conge, jours_pris, statut, date_debut = conge
         
         if type_conge in CONFIG['conges']['types_decompte_solde'] and statut == 'Actif':
-            cursor.execute("UPDATE agents SET solde = solde + ? WHERE id = ?", (jours_pris, agent_id))
+            self._mouvement_solde_no_commit(cursor, agent_id, jours_pris, "Suppression congé", conge_id, date_debut)
             
         cert = cursor.execute("SELECT chemin_fichier FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
-        if cert and cert[0] and os.path.exists(cert[0]):
-            try: os.remove(cert[0])
-            except OSError as e: logging.error(f"Erreur suppression certificat pour conge_id {conge_id}: {e}")
+        if cert and cert[0]: self._fichiers_a_verifier.append(cert[0]) # Supprimé après le commit s'il n'est plus référencé
         
         cursor.execute("DELETE FROM conges WHERE id=?", (conge_id,))
 
@@ -82,79 +305,299 @@ class DatabaseManager:
         if exists: cursor.execute("UPDATE certificats_medicaux SET nom_medecin=?, duree_jours=?, chemin_fichier=? WHERE conge_id=?", (cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier, conge_id))
         else: cursor.execute("INSERT INTO certificats_medicaux (conge_id, nom_medecin, duree_jours, chemin_fichier) VALUES (?, ?, ?, ?)", (conge_id, cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier))
 
+    def _attacher_certificat_no_commit(self, cursor, conge_id, duree_jours, chemin_fichier, sha256=None):
+        ancien = cursor.execute("SELECT chemin_fichier FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
+        if ancien and ancien[0] != chemin_fichier: self._fichiers_a_verifier.append(ancien[0])
+        cursor.execute("REPLACE INTO certificats_medicaux (conge_id, duree_jours, chemin_fichier, sha256) VALUES (?, ?, ?, ?)", (conge_id, duree_jours, chemin_fichier, sha256))
+
+    def _detacher_certificat_no_commit(self, cursor, conge_id):
+        ancien = cursor.execute("SELECT chemin_fichier FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
+        if ancien: self._fichiers_a_verifier.append(ancien[0])
+        cursor.execute("DELETE FROM certificats_medicaux WHERE conge_id = ?", (conge_id,))
+
+    def purge_orphan_files(self, paths):
+        """Supprime les fichiers de certificat qui ne sont plus référencés par aucune ligne de certificats_medicaux."""
+        for path in set(p for p in paths if p):
+            try:
+                if self.execute_query("SELECT 1 FROM certificats_medicaux WHERE chemin_fichier = ? LIMIT 1", (path,), fetch="one"): continue
+                if os.path.exists(path): os.remove(path)
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Erreur suppression du certificat {path}: {e}")
+
     def ajouter_conge(self, conge_model, cert_model=None):
-        try:
-            cursor = self.conn.cursor()
+        with self.transaction() as cursor:
             conge_id = self._ajouter_conge_no_commit(cursor, conge_model)
             if cert_model and cert_model.chemin_fichier: self._add_or_update_certificat_no_commit(cursor, conge_id, cert_model)
-            self.conn.commit()
             return conge_id
-        except sqlite3.Error as e: self.conn.rollback(); raise e
 
     def modifier_conge(self, old_conge_id, new_conge_model, cert_model=None):
-        try:
-            cursor = self.conn.cursor()
+        with self.transaction() as cursor:
             self._supprimer_conge_no_commit(cursor, old_conge_id)
             new_conge_id = self._ajouter_conge_no_commit(cursor, new_conge_model)
             if cert_model and cert_model.chemin_fichier: self._add_or_update_certificat_no_commit(cursor, new_conge_id, cert_model)
-            self.conn.commit()
             return new_conge_id
-        except sqlite3.Error as e: self.conn.rollback(); raise e
 
     def supprimer_conge(self, conge_id):
-        try:
-            cursor = self.conn.cursor()
+        with self.transaction() as cursor:
             self._supprimer_conge_no_commit(cursor, conge_id)
-            self.conn.commit()
             return True
-        except sqlite3.Error as e: self.conn.rollback(); raise e
     
-    def get_agents(self, term=None, limit=None, offset=None, exclude_id=None):
-        q = "SELECT id, nom, prenom, ppr, grade, solde FROM agents"
-        p, c = [], []
-        if term:
-            t = f"%{term.lower()}%"
-            c.append("(LOWER(nom) LIKE ? OR LOWER(prenom) LIKE ? OR LOWER(ppr) LIKE ?)")
-            p.extend([t, t, t])
+    def _agents_filter(self, term, exclude_id=None):
+        """Construit la jointure FTS5 et les conditions communes à get_agents et get_agents_count."""
+        joins, c, p = "", [], []
+        match = build_fts_query(term) if term else None
+        if match:
+            joins = " JOIN agents_fts ON agents_fts.rowid = agents.id"
+            c.append("agents_fts MATCH ?"); p.append(match)
         if exclude_id is not None:
-            c.append("id != ?"); p.append(exclude_id)
+            c.append("agents.id != ?"); p.append(exclude_id)
+        return joins, c, p
+
+    def get_agents(self, term=None, limit=None, offset=None, exclude_id=None, by_rank=False, order_by='nom', descending=False, after=None, before=None):
+        """
+        Liste des agents ; `term` est une recherche par préfixes (nom, prénom, PPR) via l'index FTS5.
+        Le tri (clé de AGENT_SORT_COLUMNS) est fait en SQL sur un index. Pagination par clé : `after` / `before` =
+        agent_sort_key de l'agent qui précède / suit le bloc (coût constant) ; limit / offset pour un accès direct.
+        """
+        joins, c, p = self._agents_filter(term, exclude_id)
+        for key, forward in ((after, True), (before, False)):
+            if key is not None:
+                seek, seek_params = _agent_seek(order_by, descending, key, forward)
+                c.append(seek); p.extend(seek_params)
+        q = "SELECT agents.id, agents.nom, agents.prenom, agents.ppr, agents.grade, agents.solde FROM agents" + joins
         if c: q += " WHERE " + " AND ".join(c)
-        q += " ORDER BY nom, prenom"
-        if limit is not None: q += " LIMIT ? OFFSET ?"; p.extend([limit, offset])
-        return [Agent.from_db_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
+        if before is not None:
+            # On parcourt l'index à rebours depuis la clé, puis on remet le bloc dans l'ordre
+            q += " ORDER BY " + _agent_sort(order_by, not descending)[1] + " LIMIT ?"; p.append(limit if limit is not None else -1)
+            return self.execute_query(q, tuple(p), fetch="all", row_factory=Agent.row_factory)[::-1]
+        q += " ORDER BY agents_fts.rank, agents.nom, agents.prenom" if by_rank and joins else " ORDER BY " + _agent_sort(order_by, descending)[1]
+        if limit is not None: q += " LIMIT ? OFFSET ?"; p.extend([limit, offset or 0])
+        return self.execute_query(q, tuple(p), fetch="all", row_factory=Agent.row_factory)
+
+    def count_agents_before(self, key, term=None, order_by='nom', descending=False):
+        """
+        Nombre d'agents (filtrés) placés avant `key` dans l'ordre demandé : c'est la position de cette clé dans la liste.
+        key reprend les premières valeurs de agent_sort_key (ex. (nom,) ou (nom, prénom, id) pour le tri par nom).
+        """
+        joins, c, p = self._agents_filter(term)
+        seek, seek_params = _agent_seek(order_by, descending, key, False)
+        c.append(seek); p.extend(seek_params)
+        return self.execute_query("SELECT COUNT(*) FROM agents" + joins + " WHERE " + " AND ".join(c), tuple(p), fetch="one")[0]
+
+    def get_agent_index(self, agent_id, term=None, order_by='nom', descending=False):
+        """Position de l'agent dans la liste (filtrée, triée) ; None s'il n'en fait pas partie."""
+        joins, c, p = self._agents_filter(term)
+        c.append("agents.id = ?"); p.append(agent_id)
+        agent = self.execute_query("SELECT agents.id, agents.nom, agents.prenom, agents.ppr, agents.grade, agents.solde FROM agents" + joins + " WHERE " + " AND ".join(c),
+                                   tuple(p), fetch="one", row_factory=Agent.row_factory)
+        return self.count_agents_before(agent_sort_key(agent, order_by), term, order_by, descending) if agent else None
 
     def get_agents_count(self, term=None):
-        q, p = "SELECT COUNT(*) FROM agents", []
-        if term:
-            t = f"%{term.lower()}%"
-            q += " WHERE LOWER(nom) LIKE ? OR LOWER(prenom) LIKE ? OR LOWER(ppr) LIKE ?"
-            p.extend([t, t, t])
-        return self.execute_query(q, tuple(p), fetch="one")[0]
+        """Nombre d'agents (filtrés), mis en cache jusqu'à la prochaine modification de la base."""
+        key = term or None
+        with self._count_cache_lock: # appelé depuis l'interface et depuis les tâches de fond
+            version = self.data_version()
+            if self._count_cache_version != version:
+                self._count_cache, self._count_cache_version = {}, version
+            if key not in self._count_cache:
+                joins, c, p = self._agents_filter(term)
+                q = "SELECT COUNT(*) FROM agents" + joins + (" WHERE " + " AND ".join(c) if c else "")
+                self._count_cache[key] = self.execute_query(q, tuple(p), fetch="one")[0]
+            return self._count_cache[key]
+
+    def data_version(self):
+        """
+        Estampille des données, identique pour tous les threads : compteur des transactions validées par ce processus
+        et PRAGMA data_version de la connexion fixe _version_conn (écritures d'un autre processus). Dans une
+        transaction, le thread voit ses écritures non validées : l'estampille lui est alors propre.
+        """
+        with self._version_lock:
+            version = (self._write_generation, self._version_conn.execute("PRAGMA data_version").fetchone()[0])
+        if self.in_transaction(): return version + (threading.get_ident(), self.writer().total_changes)
+        return version
 
     def get_agent_by_id(self, agent_id):
-        r = self.execute_query("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id=?", (agent_id,), fetch="one")
-        return Agent.from_db_row(r) if r else None
+        return self.execute_query("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id=?", (agent_id,), fetch="one", row_factory=Agent.row_factory)
         
     def get_conges(self, agent_id=None):
         q, p = "SELECT id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut FROM conges", ()
         if agent_id: q += " WHERE agent_id=? ORDER BY date_debut DESC"; p = (agent_id,)
         else: q += " ORDER BY date_debut DESC"
-        return [Conge.from_db_row(r) for r in self.execute_query(q, p, fetch="all") if r]
+        return self.execute_query(q, p, fetch="all", row_factory=Conge.row_factory)
+
+    def get_conges_view(self, agent_id, type_filter=None, order_by='debut', descending=False):
+        """
+        Congés d'un agent prêts à l'affichage, en une seule requête : tuples (Conge, certificat_present, nom_interim).
+        Le filtre de type ("Tous" ou None pour aucun filtre) et le tri (clé de CONGE_SORT_COLUMNS) sont faits en SQL.
+        """
+        if order_by not in CONGE_SORT_COLUMNS: raise ValueError(f"Tri des congés non autorisé : {order_by}")
+        q = """SELECT c.id, c.agent_id, c.type_conge, c.justif, c.interim_id, c.date_debut, c.date_fin, c.jours_pris, c.statut,
+                      cm.id IS NOT NULL AS has_cert, TRIM(i.nom || ' ' || IFNULL(i.prenom, '')) AS interim_nom
+               FROM conges c
+               LEFT JOIN certificats_medicaux cm ON cm.conge_id = c.id
+               LEFT JOIN agents i ON i.id = c.interim_id
+               WHERE c.agent_id = ?"""
+        p = [agent_id]
+        if type_filter and type_filter != "Tous": q += " AND c.type_conge = ?"; p.append(type_filter)
+        direction = "DESC" if descending else "ASC"
+        q += f" ORDER BY {CONGE_SORT_COLUMNS[order_by]} {direction}, c.date_debut {direction}, c.id {direction}"
+        return self.execute_query(q, tuple(p), fetch="all", row_factory=lambda cursor, row: (Conge(*row[:9]), bool(row[9]), row[10]))
 
     def get_conge_by_id(self, conge_id):
-        r = self.execute_query("SELECT id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut FROM conges WHERE id=?", (conge_id,), fetch="one")
-        return Conge.from_db_row(r) if r else None
+        return self.execute_query("SELECT id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut FROM conges WHERE id=?", (conge_id,), fetch="one", row_factory=Conge.row_factory)
 
     def ajouter_agent(self, nom, prenom, ppr, grade, solde):
-        try: self.execute_query("INSERT INTO agents (nom, prenom, ppr, grade, solde) VALUES (?, ?, ?, ?, ?)",(nom.strip(), prenom.strip(), ppr.strip(), grade.strip(), solde)); return True
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f"INSERT INTO agents ({_AGENT_WRITE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", _agent_row(nom, prenom, ppr, grade, solde))
+                self._aligner_journal_solde_no_commit(cursor, "Solde initial", cursor.lastrowid)
+            return True
         except sqlite3.IntegrityError: return False
 
     def modifier_agent(self, agent_id, nom, prenom, ppr, grade, solde):
-        try: self.execute_query("UPDATE agents SET nom=?, prenom=?, ppr=?, grade=?, solde=? WHERE id=?",(nom.strip(), prenom.strip(), ppr.strip(), grade.strip(), solde, agent_id)); return True
+        try:
+            with self.transaction() as cursor:
+                cursor.execute("UPDATE agents SET nom=?, prenom=?, ppr=?, grade=?, solde=?, nom_recherche=?, prenom_recherche=?, ppr_recherche=? WHERE id=?",
+                               _agent_row(nom, prenom, ppr, grade, solde) + (agent_id,))
+                self._aligner_journal_solde_no_commit(cursor, "Ajustement manuel", agent_id)
+            return True
         except sqlite3.IntegrityError: return False
 
     def supprimer_agent(self, agent_id):
-        self.execute_query("DELETE FROM agents WHERE id=?", (agent_id,)); return True
+        with self.transaction() as cursor:
+            # Les certificats partent en cascade : leurs fichiers sont vérifiés après le commit
+            self._fichiers_a_verifier.extend(r[0] for r in cursor.execute(
+                "SELECT cm.chemin_fichier FROM certificats_medicaux cm JOIN conges c ON c.id = cm.conge_id WHERE c.agent_id = ?", (agent_id,)))
+            cursor.execute("DELETE FROM agents WHERE id=?", (agent_id,))
+        return True
+
+    def get_agent_by_ppr(self, ppr):
+        return self.execute_query("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE ppr=?", (ppr,), fetch="one", row_factory=Agent.row_factory)
+
+    def upsert_agents(self, agents_rows, chunk_size=500, progress=None):
+        """
+        Ajoute ou met à jour (par PPR) une liste d'agents (nom, prénom, ppr, grade, solde), par lots de chunk_size.
+        Chaque lot est une transaction courte (solde journalisé compris) : les écritures de l'interface passent entre
+        deux lots au lieu d'attendre tout l'import. L'écriture par PPR étant idempotente, un import interrompu se
+        termine en le relançant ; appelée dans une transaction englobante, la méthode reste atomique (SAVEPOINT).
+        progress(lignes écrites) est appelé après chaque lot. Retourne (nombre d'ajouts, nombre de mises à jour).
+        """
+        rows = [_agent_row(*row) for row in agents_rows]
+        added = updated = 0
+        try:
+            for i in range(0, len(rows), chunk_size):
+                batch = rows[i:i + chunk_size]
+                pprs = list(dict.fromkeys(r[2] for r in batch))
+                with self.transaction() as cursor:
+                    existing = {r[0] for r in cursor.execute(f"SELECT ppr FROM agents WHERE ppr IN ({','.join('?' * len(pprs))})", pprs)}
+                    cursor.executemany(f"""INSERT INTO agents ({_AGENT_WRITE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                           ON CONFLICT(ppr) DO UPDATE SET nom = excluded.nom, prenom = excluded.prenom, grade = excluded.grade, solde = excluded.solde,
+                                                                          nom_recherche = excluded.nom_recherche, prenom_recherche = excluded.prenom_recherche""", batch)
+                    self._aligner_journal_solde_no_commit(cursor, "Import", pprs=pprs)
+                added, updated = added + len(pprs) - len(existing), updated + len(existing)
+                if progress: progress(min(i + chunk_size, len(rows)))
+        except sqlite3.Error as e:
+            logging.error(f"Erreur lors de l'import groupé des agents : {e}", exc_info=True)
+            raise e
+        return added, updated
+
+    def refresh_solde_snapshots(self):
+        """
+        Crée les instantanés de fin d'année manquants pour les années révolues depuis le début du journal (une requête
+        groupée par année). Les mouvements datés plus tard dans une année close les corrigent (trigger).
+        """
+        done = {r[0] for r in self.execute_query("SELECT DISTINCT annee FROM solde_snapshots", fetch="all")}
+        missing = [y for y in range(self.get_debut_journal_solde().year, datetime.now().year) if y not in done]
+        if not missing: return
+        with self.transaction() as cursor:
+            for annee in missing:
+                cursor.execute("""INSERT OR REPLACE INTO solde_snapshots (agent_id, annee, solde)
+                                  SELECT agent_id, ?, SUM(delta) FROM solde_mouvements WHERE date_mouvement < ? GROUP BY agent_id""",
+                               (annee, f"{annee + 1:04d}-01-01"))
+        logging.info(f"Instantanés de solde créés pour : {missing}")
+
+    def get_debut_journal_solde(self):
+        """Date de début du journal des soldes (migration 7) : les soldes antérieurs sont inconnus."""
+        return date.fromisoformat(self.execute_query("SELECT debut FROM solde_journal", fetch="one")[0])
+
+    def get_solde_at(self, agent_id, day):
+        """
+        Solde de l'agent à la fin de la journée donnée : dernier instantané annuel + mouvements postérieurs.
+        Lève ValueError pour une date antérieure au début du journal (get_debut_journal_solde).
+        """
+        day, debut_journal = _ordinal(day), self.get_debut_journal_solde()
+        if day < debut_journal.toordinal():
+            raise ValueError(f"Solde inconnu avant le début du journal des soldes ({debut_journal.strftime('%d/%m/%Y')}).")
+        fin = date.fromordinal(day + 1).isoformat()
+        snap = self.execute_query("SELECT annee, solde FROM solde_snapshots WHERE agent_id = ? AND annee < ? ORDER BY annee DESC LIMIT 1",
+                                  (agent_id, date.fromordinal(day).year), fetch="one")
+        base, debut = (snap[1], f"{snap[0] + 1:04d}-01-01") if snap else (0.0, "")
+        tail = self.execute_query("SELECT IFNULL(SUM(delta), 0) FROM solde_mouvements WHERE agent_id = ? AND date_mouvement >= ? AND date_mouvement < ?",
+                                  (agent_id, debut, fin), fetch="one")[0]
+        return base + tail
+
+    def get_soldes_incoherents(self):
+        """Contrôle global en une requête : agents dont le solde diffère de la somme de leur journal."""
+        return self.execute_query("""SELECT a.id, a.nom, a.prenom, a.ppr, a.solde, IFNULL(m.total, 0) FROM agents a
+                                     LEFT JOIN (SELECT agent_id, SUM(delta) AS total FROM solde_mouvements GROUP BY agent_id) m ON m.agent_id = a.id
+                                     WHERE ABS(a.solde - IFNULL(m.total, 0)) > 1e-6 ORDER BY a.nom, a.prenom""", fetch="all")
+
+    def iter_query(self, query, params=(), chunk_size=1000):
+        """Parcourt un résultat par blocs de chunk_size lignes (fetchmany) : la mémoire reste bornée."""
+        cursor = self.reader().cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            yield rows
+
+    def _conges_export_filter(self, year=None, type_conge=None, grade=None):
+        c, p = [], []
+        if year: c.append("c.date_debut >= ? AND c.date_debut < ?"); p += [f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01"]
+        if type_conge: c.append("c.type_conge = ?"); p.append(type_conge)
+        if grade: c.append("a.grade = ?"); p.append(grade)
+        return (" WHERE " + " AND ".join(c) if c else ""), p
+
+    def count_conges_export(self, year=None, type_conge=None, grade=None):
+        where, p = self._conges_export_filter(year, type_conge, grade)
+        return self.execute_query("SELECT COUNT(*) FROM conges c LEFT JOIN agents a ON a.id = c.agent_id" + where, tuple(p), fetch="one")[0]
+
+    def iter_conges_export(self, year=None, type_conge=None, grade=None, chunk_size=1000):
+        """
+        Congés filtrés (année de début, type, grade de l'agent) avec agent et intérimaire joints, par blocs :
+        (nom, prénom, ppr, type, début, fin, jours, statut, justif, interim_id, nom intérim, prénom intérim).
+        """
+        where, p = self._conges_export_filter(year, type_conge, grade)
+        q = """SELECT a.nom, a.prenom, a.ppr, c.type_conge, c.date_debut, c.date_fin, c.jours_pris, c.statut, c.justif, c.interim_id, i.nom, i.prenom
+               FROM conges c LEFT JOIN agents a ON a.id = c.agent_id LEFT JOIN agents i ON i.id = c.interim_id""" + where + " ORDER BY c.date_debut DESC, c.id"
+        return self.iter_query(q, tuple(p), chunk_size)
+
+    def iter_agents_export(self, chunk_size=1000):
+        return self.iter_query("SELECT id, nom, prenom, ppr, grade, solde FROM agents ORDER BY nom, prenom, id", chunk_size=chunk_size)
+
+    def iter_holidays_export(self, chunk_size=1000):
+        return self.iter_query("SELECT date, nom, type FROM jours_feries_personnalises ORDER BY date", chunk_size=chunk_size)
+
+    def iter_certificats_export(self, chunk_size=1000):
+        """Métadonnées des certificats : (conge_id, ppr, nom, prénom, début, fin, médecin, durée, fichier, sha256)."""
+        return self.iter_query("""SELECT c.id, a.ppr, a.nom, a.prenom, c.date_debut, c.date_fin, cm.nom_medecin, cm.duree_jours, cm.chemin_fichier, cm.sha256
+                                  FROM certificats_medicaux cm JOIN conges c ON c.id = cm.conge_id LEFT JOIN agents a ON a.id = c.agent_id
+                                  ORDER BY c.date_debut DESC, c.id""", chunk_size=chunk_size)
+
+    def get_conges_years(self):
+        return [r[0] for r in self.execute_query("SELECT DISTINCT year FROM conges_summary ORDER BY year DESC", fetch="all")]
+
+    def get_jours_pris_par_annee(self, agent_id, type_conge='Congé annuel', statut='Actif'):
+        """Total des jours pris par année pour un agent, lu dans la table de synthèse conges_summary."""
+        rows = self.execute_query("SELECT year, jours FROM conges_summary WHERE agent_id = ? AND type_conge = ? AND statut = ?", (agent_id, type_conge, statut), fetch="all")
+        return dict(rows)
+
+    def rebuild_conges_summary(self):
+        """Reconstruit entièrement la table de synthèse à partir de conges (réparation / vérification)."""
+        with self.transaction() as cursor:
+            cursor.execute(SUMMARY_REBUILD_DELETE)
+            cursor.execute(SUMMARY_REBUILD_INSERT)
+        logging.info("Table conges_summary reconstruite.")
 
     def get_holidays_for_year(self, year):
         return self.execute_query("SELECT date, nom, type FROM jours_feries_personnalises WHERE strftime('%Y', date) = ? ORDER BY date", (str(year),), fetch="all")
@@ -162,11 +605,40 @@ class DatabaseManager:
     def get_certificat_for_conge(self, conge_id):
         return self.execute_query("SELECT * FROM certificats_medicaux WHERE conge_id = ?", (conge_id,), fetch="one")
 
+    def get_leaves_in_range(self, start_date, end_date, agent_id=None, statut='Actif', conge_id_exclu=None):
+        """
+        Congés chevauchant la période [start_date, end_date], pour un agent ou pour tout le personnel.
+        La recherche passe par l'index R*Tree conges_rtree (ordinaux de dates). statut=None : tous les statuts.
+        """
+        q = """SELECT c.id, c.agent_id, c.type_conge, c.justif, c.interim_id, c.date_debut, c.date_fin, c.jours_pris, c.statut
+               FROM conges_rtree r JOIN conges c ON c.id = r.id WHERE r.debut <= ? AND r.fin >= ?"""
+        p = [_ordinal(end_date), _ordinal(start_date)]
+        if agent_id is not None: q += " AND r.agent_min <= ? AND r.agent_max >= ?"; p += [agent_id, agent_id]
+        if statut: q += " AND c.statut = ?"; p.append(statut)
+        if conge_id_exclu: q += " AND c.id != ?"; p.append(conge_id_exclu)
+        q += " ORDER BY c.date_debut"
+        return self.execute_query(q, tuple(p), fetch="all", row_factory=Conge.row_factory)
+
     def get_overlapping_leaves(self, agent_id, start_date, end_date, conge_id_exclu=None):
-        q = "SELECT * FROM conges WHERE agent_id=? AND date_fin >= ? AND date_debut <= ? AND statut = 'Actif'"
-        p = [agent_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]
-        if conge_id_exclu: q += " AND id != ?"; p.append(conge_id_exclu)
-        return [Conge.from_db_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
+        return self.get_leaves_in_range(start_date, end_date, agent_id=agent_id, conge_id_exclu=conge_id_exclu)
+
+    def get_leave_intervals(self, start_date, end_date):
+        """Périodes de congé actives chevauchant [start_date, end_date] : (agent_id, ordinal début, ordinal fin, type, grade), triées par agent."""
+        q = """SELECT c.agent_id, r.debut, r.fin, c.type_conge, a.grade
+               FROM conges_rtree r JOIN conges c ON c.id = r.id JOIN agents a ON a.id = c.agent_id
+               WHERE r.debut <= ? AND r.fin >= ? AND c.statut = 'Actif' ORDER BY c.agent_id, r.debut"""
+        return self.execute_query(q, (_ordinal(end_date), _ordinal(start_date)), fetch="all")
+
+    def get_agents_count_by_grade(self):
+        return dict(self.execute_query("SELECT grade, COUNT(*) FROM agents GROUP BY grade", fetch="all"))
+
+    def get_absent_agents(self, start_date, end_date=None):
+        """Agents ayant un congé actif sur la journée (ou la période) demandée."""
+        q = """SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id IN (
+                   SELECT c.agent_id FROM conges_rtree r JOIN conges c ON c.id = r.id
+                   WHERE r.debut <= ? AND r.fin >= ? AND c.statut = 'Actif')
+               ORDER BY nom, prenom, id"""
+        return self.execute_query(q, (_ordinal(end_date or start_date), _ordinal(start_date)), fetch="all", row_factory=Agent.row_factory)
     
     # --- MÉTHODES MANQUANTES AJOUTÉES ICI ---
 
@@ -174,6 +646,7 @@ class DatabaseManager:
         """Ajoute ou met à jour un jour férié. Idéal pour les jours automatiques."""
         query = "REPLACE INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, ?)"
         self.execute_query(query, (date_sql, name, h_type))
+        invalidate_holidays_cache(date_sql[:4])
         return True
 
     def add_holiday(self, date_sql, name, h_type):
@@ -181,6 +654,7 @@ class DatabaseManager:
         try:
             query = "INSERT INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, ?)"
             self.execute_query(query, (date_sql, name, h_type))
+            invalidate_holidays_cache(date_sql[:4])
             return True
         except sqlite3.IntegrityError: # Se produit si la clé primaire (date) existe déjà
             return False
@@ -188,7 +662,16 @@ class DatabaseManager:
     def delete_holiday(self, date_sql):
         """Supprime un jour férié par sa date."""
         self.execute_query("DELETE FROM jours_feries_personnalises WHERE date = ?", (date_sql,))
+        invalidate_holidays_cache(date_sql[:4])
         return True
+
+    def upsert_holidays(self, rows):
+        """Ajoute ou remplace (par date) une liste de jours fériés (date SQL, nom, type) en une seule transaction."""
+        rows = list(rows)
+        with self.transaction() as cursor:
+            cursor.executemany("REPLACE INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, ?)", rows)
+        for year in {r[0][:4] for r in rows}: invalidate_holidays_cache(year)
+        return len(rows)
         
     def get_maladies_sans_certificat(self):
         """Récupère les congés maladie actifs sans justificatif associé."""
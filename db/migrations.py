@@ -0,0 +1,195 @@
+# db/migrations.py
+"""
+Migrations numérotées du schéma de la base.
+La version appliquée est mémorisée dans PRAGMA user_version : au démarrage, seules les
+migrations plus récentes sont exécutées, toutes dans une seule transaction.
+"""
+import logging
+
+from utils.date_utils import validate_date, to_sql_date
+from utils.text_utils import normalize_search_text
+
+
+def _normaliser_dates_conges(conn):
+    """
+    Les anciennes versions enregistraient les dates des congés sous la forme 'YYYY-MM-DD HH:MM:SS'
+    (objet datetime converti par sqlite3). On les réécrit au format YYYY-MM-DD, telles que
+    l'application les lisait, pour que les requêtes SQL sur les dates soient fiables.
+    """
+    rows = conn.execute("SELECT id, date_debut, date_fin FROM conges WHERE length(date_debut) != 10 OR length(date_fin) != 10").fetchall()
+    updates = []
+    for conge_id, date_debut, date_fin in rows:
+        debut, fin = validate_date(date_debut), validate_date(date_fin)
+        if not debut or not fin:
+            logging.warning(f"Migration : dates illisibles pour le congé ID {conge_id}, ligne laissée telle quelle.")
+            continue
+        updates.append((to_sql_date(debut), to_sql_date(fin), conge_id))
+    conn.executemany("UPDATE conges SET date_debut = ?, date_fin = ? WHERE id = ?", updates)
+
+
+def _remplir_colonnes_recherche(conn):
+    """Colonnes de recherche des agents existants, normalisées en Python comme à chaque écriture de l'application."""
+    rows = conn.execute("SELECT id, nom, prenom, ppr FROM agents").fetchall()
+    conn.executemany("UPDATE agents SET nom_recherche = ?, prenom_recherche = ?, ppr_recherche = ? WHERE id = ?",
+                     [(normalize_search_text(nom), normalize_search_text(prenom), normalize_search_text(ppr), agent_id) for agent_id, nom, prenom, ppr in rows])
+
+
+# --- Synthèse par agent, année, type et statut (conges_summary) ---
+_SUMMARY_YEAR = "IFNULL(CAST(strftime('%Y', {row}.date_debut) AS INTEGER), 0)"
+_SUMMARY_ADD = ("INSERT INTO conges_summary (agent_id, year, type_conge, statut, jours, count) "
+                "VALUES ({row}.agent_id, " + _SUMMARY_YEAR + ", {row}.type_conge, {row}.statut, {row}.jours_pris, 1) "
+                "ON CONFLICT(agent_id, year, type_conge, statut) DO UPDATE SET jours = jours + excluded.jours, count = count + 1;")
+_SUMMARY_KEY = "agent_id = {row}.agent_id AND year = " + _SUMMARY_YEAR + " AND type_conge = {row}.type_conge AND statut = {row}.statut"
+_SUMMARY_REMOVE = ("UPDATE conges_summary SET jours = jours - {row}.jours_pris, count = count - 1 WHERE " + _SUMMARY_KEY + "; "
+                   "DELETE FROM conges_summary WHERE " + _SUMMARY_KEY + " AND count <= 0;")
+SUMMARY_REBUILD_DELETE = "DELETE FROM conges_summary"
+SUMMARY_REBUILD_INSERT = ("INSERT INTO conges_summary (agent_id, year, type_conge, statut, jours, count) "
+                          "SELECT agent_id, " + _SUMMARY_YEAR.format(row='conges') + ", type_conge, statut, SUM(jours_pris), COUNT(*) "
+                          "FROM conges GROUP BY 1, 2, 3, 4")
+
+
+# --- Index R*Tree des congés : (agent_id, agent_id) x (ordinal début, ordinal fin) ---
+# L'ordinal SQL correspond à date.toordinal() côté Python (1 = 0001-01-01).
+_ORDINAL = "CAST(julianday({col}) - 1721424.5 AS INTEGER)"
+_RTREE_INSERT = ("INSERT INTO conges_rtree (id, agent_min, agent_max, debut, fin) "
+                 "SELECT {row}.id, {row}.agent_id, {row}.agent_id, "
+                 "MIN(" + _ORDINAL.format(col='{row}.date_debut') + ", " + _ORDINAL.format(col='{row}.date_fin') + "), "
+                 "MAX(" + _ORDINAL.format(col='{row}.date_debut') + ", " + _ORDINAL.format(col='{row}.date_fin') + ") "
+                 "WHERE julianday({row}.date_debut) IS NOT NULL AND julianday({row}.date_fin) IS NOT NULL")
+
+
+# (version, description, étapes) — une étape est une requête SQL ou une fonction recevant la connexion.
+MIGRATIONS = [
+    (1, "Tables de base", [
+        """CREATE TABLE IF NOT EXISTS agents (id INTEGER PRIMARY KEY, nom TEXT NOT NULL, prenom TEXT, ppr TEXT UNIQUE NOT NULL, grade TEXT NOT NULL, solde REAL NOT NULL CHECK(solde >= 0))""",
+        """CREATE TABLE IF NOT EXISTS conges (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_conge TEXT NOT NULL, justif TEXT, interim_id INTEGER, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL CHECK(jours_pris >= 0), statut TEXT NOT NULL DEFAULT 'Actif', FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE, FOREIGN KEY (interim_id) REFERENCES agents(id) ON DELETE SET NULL)""",
+        """CREATE TABLE IF NOT EXISTS jours_feries_personnalises (date TEXT PRIMARY KEY, nom TEXT NOT NULL, type TEXT NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT, duree_jours INTEGER, chemin_fichier TEXT NOT NULL, FOREIGN KEY (conge_id) REFERENCES conges(id) ON DELETE CASCADE)""",
+    ]),
+    (2, "Normalisation des dates des congés au format YYYY-MM-DD", [
+        _normaliser_dates_conges,
+    ]),
+    (3, "Index des requêtes courantes", [
+        "CREATE INDEX IF NOT EXISTS idx_conges_agent_debut ON conges(agent_id, date_debut)",
+        "CREATE INDEX IF NOT EXISTS idx_conges_statut_type ON conges(statut, type_conge)",
+        "CREATE INDEX IF NOT EXISTS idx_conges_date_fin ON conges(date_fin)",
+        "CREATE INDEX IF NOT EXISTS idx_conges_interim ON conges(interim_id)",
+        "CREATE INDEX IF NOT EXISTS idx_agents_nom_prenom ON agents(nom, prenom)",
+    ]),
+    # La normalisation (accents, lettres arabes) est faite en Python : DatabaseManager écrit les colonnes *_recherche avec
+    # nom, prénom et PPR, et les triggers ne font que les recopier dans agents_fts. Aucune fonction SQL n'est donc
+    # nécessaire pour écrire dans agents ; un client qui n'écrit pas ces colonnes laisse seulement la recherche périmée.
+    (4, "Index plein texte FTS5 des agents (nom, prénom, PPR)", [
+        "ALTER TABLE agents ADD COLUMN nom_recherche TEXT NOT NULL DEFAULT ''",
+        "ALTER TABLE agents ADD COLUMN prenom_recherche TEXT NOT NULL DEFAULT ''",
+        "ALTER TABLE agents ADD COLUMN ppr_recherche TEXT NOT NULL DEFAULT ''",
+        _remplir_colonnes_recherche,
+        "CREATE VIRTUAL TABLE IF NOT EXISTS agents_fts USING fts5(nom, prenom, ppr, tokenize='unicode61', prefix='1 2 3')",
+        """CREATE TRIGGER IF NOT EXISTS agents_fts_ai AFTER INSERT ON agents BEGIN
+               INSERT INTO agents_fts(rowid, nom, prenom, ppr) VALUES (new.id, new.nom_recherche, new.prenom_recherche, new.ppr_recherche);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS agents_fts_ad AFTER DELETE ON agents BEGIN
+               DELETE FROM agents_fts WHERE rowid = old.id;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS agents_fts_au AFTER UPDATE OF nom_recherche, prenom_recherche, ppr_recherche ON agents BEGIN
+               UPDATE agents_fts SET nom = new.nom_recherche, prenom = new.prenom_recherche, ppr = new.ppr_recherche WHERE rowid = old.id;
+           END""",
+        "DELETE FROM agents_fts",
+        "INSERT INTO agents_fts(rowid, nom, prenom, ppr) SELECT id, nom_recherche, prenom_recherche, ppr_recherche FROM agents",
+    ]),
+    (5, "Table de synthèse conges_summary maintenue par triggers", [
+        """CREATE TABLE IF NOT EXISTS conges_summary (agent_id INTEGER NOT NULL, year INTEGER NOT NULL, type_conge TEXT NOT NULL, statut TEXT NOT NULL,
+               jours INTEGER NOT NULL DEFAULT 0, count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (agent_id, year, type_conge, statut)) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_conges_summary_year ON conges_summary(year, type_conge, statut)",
+        f"""CREATE TRIGGER IF NOT EXISTS conges_summary_ai AFTER INSERT ON conges BEGIN
+               {_SUMMARY_ADD.format(row='new')}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS conges_summary_ad AFTER DELETE ON conges BEGIN
+               {_SUMMARY_REMOVE.format(row='old')}
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS conges_summary_au AFTER UPDATE OF agent_id, type_conge, statut, date_debut, jours_pris ON conges BEGIN
+               {_SUMMARY_REMOVE.format(row='old')}
+               {_SUMMARY_ADD.format(row='new')}
+           END""",
+        SUMMARY_REBUILD_DELETE,
+        SUMMARY_REBUILD_INSERT,
+    ]),
+    (6, "Index R*Tree des périodes de congé", [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS conges_rtree USING rtree_i32(id, agent_min, agent_max, debut, fin)",
+        f"""CREATE TRIGGER IF NOT EXISTS conges_rtree_ai AFTER INSERT ON conges BEGIN
+               {_RTREE_INSERT.format(row='new')};
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS conges_rtree_ad AFTER DELETE ON conges BEGIN
+               DELETE FROM conges_rtree WHERE id = old.id;
+           END""",
+        f"""CREATE TRIGGER IF NOT EXISTS conges_rtree_au AFTER UPDATE OF agent_id, date_debut, date_fin ON conges BEGIN
+               DELETE FROM conges_rtree WHERE id = old.id;
+               {_RTREE_INSERT.format(row='new')};
+           END""",
+        "DELETE FROM conges_rtree",
+        _RTREE_INSERT.replace("{row}", "conges").replace("WHERE", "FROM conges WHERE"),
+    ]),
+    # Un mouvement est daté par l'événement qui le porte (date de début du congé, date de saisie d'un crédit), pas par
+    # son enregistrement : un congé saisi en retard compte dans son année. L'historique antérieur au journal étant
+    # inconnu, le solde de chaque agent au jour de la migration devient son « Solde initial », daté de solde_journal.debut ;
+    # aucun solde n'est restitué avant cette date.
+    (7, "Journal des mouvements de solde et instantanés annuels", [
+        """CREATE TABLE IF NOT EXISTS solde_mouvements (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, date_mouvement TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+               delta REAL NOT NULL, motif TEXT NOT NULL, conge_id INTEGER, FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE)""",
+        "CREATE INDEX IF NOT EXISTS idx_solde_mouvements_agent_date ON solde_mouvements(agent_id, date_mouvement, delta)",
+        """CREATE TRIGGER IF NOT EXISTS solde_mouvements_append_only BEFORE UPDATE ON solde_mouvements BEGIN
+               SELECT RAISE(ABORT, 'Le journal des soldes ne peut pas être modifié.');
+           END""",
+        # Instantané : solde de l'agent au 31/12 de l'année (tous les mouvements antérieurs au 1er janvier suivant)
+        """CREATE TABLE IF NOT EXISTS solde_snapshots (agent_id INTEGER NOT NULL, annee INTEGER NOT NULL, solde REAL NOT NULL,
+               PRIMARY KEY (agent_id, annee), FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE) WITHOUT ROWID""",
+        # Un mouvement daté d'une année close (congé saisi en retard) corrige les instantanés de cette année et des suivantes
+        """CREATE TRIGGER IF NOT EXISTS solde_mouvements_snapshots AFTER INSERT ON solde_mouvements BEGIN
+               UPDATE solde_snapshots SET solde = solde + new.delta WHERE agent_id = new.agent_id AND annee >= CAST(substr(new.date_mouvement, 1, 4) AS INTEGER);
+           END""",
+        "CREATE TABLE IF NOT EXISTS solde_journal (debut TEXT NOT NULL)",
+        "INSERT INTO solde_journal (debut) VALUES (date('now', 'localtime'))",
+        "INSERT INTO solde_mouvements (agent_id, date_mouvement, delta, motif) SELECT id, (SELECT debut FROM solde_journal), solde, 'Solde initial' FROM agents WHERE solde != 0",
+    ]),
+    # Les fichiers sont partagés entre congés : le nombre de lignes par chemin sert de compteur de références
+    (8, "Empreinte SHA-256 des certificats et index par fichier", [
+        "ALTER TABLE certificats_medicaux ADD COLUMN sha256 TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_certificats_chemin ON certificats_medicaux(chemin_fichier)",
+    ]),
+    # Tri de la liste des agents en SQL (AGENT_SORT_COLUMNS) : un index par tri, avec les mêmes expressions et collations
+    # que l'ORDER BY (id = rowid implicite). Textes en NOCASE, PPR en ordre numérique (index d'expression).
+    # idx_agents_nom_prenom (BINARY) reste utilisé par les exports et rapports.
+    (9, "Index de tri de la liste des agents", [
+        "UPDATE agents SET prenom = '' WHERE prenom IS NULL", # Les comparaisons de tuples ne supportent pas NULL
+        "CREATE INDEX IF NOT EXISTS idx_agents_nom_nocase ON agents(nom COLLATE NOCASE, prenom COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_agents_prenom_nocase ON agents(prenom COLLATE NOCASE, nom COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_agents_ppr_num ON agents(CAST(ppr AS INTEGER), ppr)",
+        "CREATE INDEX IF NOT EXISTS idx_agents_grade_nocase ON agents(grade COLLATE NOCASE, nom COLLATE NOCASE, prenom COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_agents_solde_nocase ON agents(solde, nom COLLATE NOCASE, prenom COLLATE NOCASE)",
+    ]),
+]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """Applique les migrations en attente dans une seule transaction. Retourne la version finale."""
+    current = get_schema_version(conn)
+    pending = [m for m in migrations if m[0] > current]
+    if not pending:
+        return current
+    try:
+        conn.execute("BEGIN")
+        for version, description, steps in pending:
+            logging.info(f"Migration du schéma vers la version {version} : {description}")
+            for step in steps:
+                if callable(step): step(conn)
+                else: conn.execute(step)
+        conn.execute(f"PRAGMA user_version = {pending[-1][0]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return pending[-1][0]
@@ -1,8 +1,11 @@
 # db/models.py
+from datetime import datetime
 from utils.date_utils import validate_date
 
 class Agent:
     """Représente un agent avec ses attributs."""
+    __slots__ = ('id', 'nom', 'prenom', 'ppr', 'grade', 'solde')
+
     def __init__(self, id, nom, prenom, ppr, grade, solde):
         self.id = id
         self.nom = nom
@@ -21,19 +24,49 @@ class Agent:
             return None
         return cls(id=row[0], nom=row[1], prenom=row[2], ppr=row[3], grade=row[4], solde=row[5])
 
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """row_factory sqlite3 : construit directement l'objet à partir de la ligne brute."""
+        return cls(*row)
+
 class Conge:
-    """Représente un congé avec ses attributs."""
+    """
+    Représente un congé avec ses attributs.
+    Les dates sont conservées brutes (chaînes SQL) et converties en datetime au premier accès.
+    """
+    __slots__ = ('id', 'agent_id', 'type_conge', 'justif', 'interim_id', '_date_debut', '_date_fin', 'jours_pris', 'statut')
+
     def __init__(self, id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut='Actif'):
         self.id = id
         self.agent_id = agent_id
         self.type_conge = type_conge
         self.justif = justif
         self.interim_id = interim_id
-        self.date_debut = validate_date(date_debut) # Convertit la chaîne en objet datetime
-        self.date_fin = validate_date(date_fin)     # Convertit la chaîne en objet datetime
+        self._date_debut = date_debut
+        self._date_fin = date_fin
         self.jours_pris = jours_pris
         self.statut = statut
 
+    @property
+    def date_debut(self):
+        if self._date_debut is not None and not isinstance(self._date_debut, datetime):
+            self._date_debut = validate_date(self._date_debut) # Conversion paresseuse, une seule fois
+        return self._date_debut
+
+    @date_debut.setter
+    def date_debut(self, value):
+        self._date_debut = value
+
+    @property
+    def date_fin(self):
+        if self._date_fin is not None and not isinstance(self._date_fin, datetime):
+            self._date_fin = validate_date(self._date_fin) # Conversion paresseuse, une seule fois
+        return self._date_fin
+
+    @date_fin.setter
+    def date_fin(self, value):
+        self._date_fin = value
+
     def __str__(self):
         debut_str = self.date_debut.strftime('%d/%m/%Y') if self.date_debut else 'N/A'
         fin_str = self.date_fin.strftime('%d/%m/%Y') if self.date_fin else 'N/A'
@@ -46,13 +79,18 @@ class Conge:
             return None
         # L'ordre des colonnes doit correspondre à la requête SELECT
         return cls(
-            id=row[0], 
-            agent_id=row[1], 
-            type_conge=row[2], 
-            justif=row[3], 
-            interim_id=row[4], 
-            date_debut=row[5], 
-            date_fin=row[6], 
+            id=row[0],
+            agent_id=row[1],
+            type_conge=row[2],
+            justif=row[3],
+            interim_id=row[4],
+            date_debut=row[5],
+            date_fin=row[6],
             jours_pris=row[7],
             statut=row[8]
-        )
\ No newline at end of file
+        )
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """row_factory sqlite3 : construit directement l'objet à partir de la ligne brute."""
+        return cls(*row)
@@ -73,6 +73,35 @@ if __name__ == "__main__":
         
     # 6.3. S'assurer que les tables existent
     db_manager.create_db_tables()
+
+    # Commande de maintenance : python main.py --rebuild-summary
+    if "--rebuild-summary" in sys.argv:
+        db_manager.rebuild_conges_summary()
+        print("Table de synthèse conges_summary reconstruite.")
+        db_manager.close()
+        sys.exit(0)
+
+    # Commande de maintenance : python main.py --check-soldes
+    if "--check-soldes" in sys.argv:
+        incoherents = db_manager.get_soldes_incoherents()
+        for agent_id, nom, prenom, ppr, solde, total in incoherents:
+            print(f"{nom} {prenom} (PPR: {ppr}) : solde {solde:.1f} / journal {total:.1f}")
+        print(f"{len(incoherents)} solde(s) incohérent(s).")
+        db_manager.close()
+        sys.exit(0)
+    
+    # Extraction sans interface : python main.py --export agents|conges|jours_feries|certificats FICHIER(.xlsx|.csv|.jsonl)
+    if "--export" in sys.argv:
+        from utils.file_utils import write_dataset, EXPORT_DATASETS
+        from utils.task_executor import DirectContext
+        args = sys.argv[sys.argv.index("--export") + 1:]
+        if len(args) < 2 or args[0] not in EXPORT_DATASETS:
+            print(f"Usage : python main.py --export {'|'.join(EXPORT_DATASETS)} FICHIER(.xlsx|.csv|.jsonl)")
+            db_manager.close(); sys.exit(2)
+        count = write_dataset(db_manager, args[0], args[1], DirectContext())
+        print(f"{count} ligne(s) exportée(s) vers {args[1]}.")
+        db_manager.close()
+        sys.exit(0)
     
     # 6.4. Créer le "cerveau" de l'application
     conge_manager = CongeManager(db_manager, CERTIFICATS_DIR_ABS)
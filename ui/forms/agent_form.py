@@ -2,6 +2,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from utils.config_loader import CONFIG
+from db.database import DatabaseBusyError
 from ui.widgets.arabic_keyboard import ArabicKeyboard
 
 class AgentForm(tk.Toplevel):
@@ -115,5 +116,7 @@ class AgentForm(tk.Toplevel):
 
         except ValueError as e:
             messagebox.showerror("Erreur de saisie", str(e), parent=self)
+        except DatabaseBusyError as e:
+            messagebox.showwarning("Base occupée", str(e), parent=self)
         except Exception as e:
             messagebox.showerror("Erreur Inattendue", f"Une erreur est survenue: {e}", parent=self)
\ No newline at end of file
@@ -8,7 +8,9 @@ from core.conges.strategies import (
     CongeAnnuelStrategy, CongeMaladieStrategy, CongeMaterniteStrategy,
     CongePaterniteStrategy, CongeCalendaireStrategy
 )
+from core.conges.certificate_store import CopyCancelled
 from ui.widgets.date_picker import DatePickerWindow
+from ui.widgets.secondary_windows import ProgressWindow
 from utils.date_utils import validate_date, format_date_for_display, get_holidays_set_for_period, calculate_reprise_date
 from utils.config_loader import CONFIG
 
@@ -235,6 +237,16 @@ class CongeForm(tk.Toplevel):
                 'original_cert_path': self.original_cert_path,
             }
             
+            # Nouveau justificatif : copie (hachage + déduplication) en arrière-plan avant l'enregistrement
+            if form_data['type_conge'] == "Congé de maladie" and form_data['cert_path'] and form_data['cert_path'] != self.original_cert_path:
+                try:
+                    form_data['cert_stored'] = ProgressWindow.run(self, "Copie du justificatif",
+                        lambda progress, cancelled: self.manager.cert_store.store(form_data['cert_path'], progress, cancelled), self.parent.executor)
+                except CopyCancelled:
+                    return
+                except OSError as e:
+                    messagebox.showerror("Erreur Certificat", f"Le certificat n'a pas pu être copié:\n{e}", parent=self); return
+
             success = self.manager.handle_conge_submission(form_data, self.is_modification)
             
             if success:
@@ -2,7 +2,7 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-from collections import defaultdict, Counter
+from collections import defaultdict
 from dateutil import parser
 import logging
 import os
@@ -10,15 +10,22 @@ import sqlite3
 
 # Import des composants de votre architecture
 from core.conges.manager import CongeManager
+from core.stats.service import StatsService
+from db.database import agent_sort_key, DatabaseBusyError
 from db.models import Agent, Conge
 from ui.forms.agent_form import AgentForm
 from ui.forms.conge_form import CongeForm
-from ui.widgets.secondary_windows import HolidaysManagerWindow, JustificatifsWindow 
+from ui.widgets.secondary_windows import HolidaysManagerWindow, JustificatifsWindow, TimelineWindow
 from ui.widgets.arabic_keyboard import ArabicKeyboard
 from ui.widgets.date_picker import DatePickerWindow
+from ui.widgets.virtual_treeview import VirtualTreeview
+from ui.widgets.agent_search import AgentSearchController, count_rows_before
 from utils.file_utils import export_agents_to_excel, export_all_conges_to_excel, import_agents_from_excel
 from utils.date_utils import format_date_for_display, calculate_reprise_date, get_holidays_set_for_period
 from utils.config_loader import CONFIG
+from utils.task_executor import TaskExecutor
+
+MOIS = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
 
 def format_date_for_display_short(date_obj):
     """Convertit un objet date en format affichable court (JJ/MM/AA)."""
@@ -30,21 +37,16 @@ def format_date_for_display_short(date_obj):
     except (ValueError, TypeError):
         return str(date_obj)
 
-def treeview_sort_column(tv, col, reverse):
-    l = [(tv.set(k, col), k) for k in tv.get_children('')]
-    numeric_cols = ['Solde', 'Jours', 'PPR']
-    try:
-        if col in numeric_cols:
-            l.sort(key=lambda t: float(str(t[0]).replace(',', '.')), reverse=reverse)
-        else:
-            l.sort(key=lambda t: str(t[0]).lower(), reverse=reverse)
-    except (ValueError, IndexError):
-        l.sort(key=lambda t: str(t[0]), reverse=reverse)
-    
-    for index, (val, k) in enumerate(l):
-        tv.move(k, '', index)
-    
-    tv.heading(col, command=lambda: treeview_sort_column(tv, col, not reverse))
+# Colonnes triables : en-tête -> clé de tri de la base (AGENT_SORT_COLUMNS / CONGE_SORT_COLUMNS). Le tri est fait en SQL.
+AGENT_SORT_KEYS = {"Nom": 'nom', "Prénom": 'prenom', "PPR": 'ppr', "Grade": 'grade', "Solde": 'solde'}
+CONGE_SORT_KEYS = {"Certificat": 'certificat', "Type": 'type', "Début": 'debut', "Fin": 'fin', "Date Reprise": 'fin',
+                   "Jours": 'jours', "Justification": 'justif', "Intérimaire": 'interim'}
+
+def update_sort_headings(tv, sort_keys, sort):
+    """Affiche ▲ / ▼ sur les en-têtes de la colonne triée."""
+    key, descending = sort
+    for col, col_key in sort_keys.items():
+        tv.heading(col, text=f"{col} {'▼' if descending else '▲'}" if col_key == key else col)
 
 
 class MainWindow(tk.Tk):
@@ -52,20 +54,34 @@ class MainWindow(tk.Tk):
         super().__init__()
         self.manager = manager
         self.db = self.manager.db
+        self.stats_service = StatsService(self.db)
+        self.executor = TaskExecutor(self)
+        self._stats_generation = 0
+        self.agents_sort = ('nom', False)   # (clé de tri, décroissant)
+        self.conges_sort = ('debut', False)
+        # Recherche temporisée et exécutée en arrière-plan ; search_rows = résultat trié (None sans recherche ou s'il est
+        # trop grand pour la mémoire : la liste est alors lue dans la base, filtrée par search_term)
+        self.search_rows, self.search_term, self._search_positions = None, None, {}
+        self.search = AgentSearchController(self, self.executor, self.db, self._on_search_results, lambda: self.agents_sort)
 
         self.title(f"{CONFIG['app']['title']} - v{CONFIG['app']['version']}")
         self.minsize(1200, 700)
             
         self.protocol("WM_DELETE_WINDOW", self.on_close)
-        self.current_page = 1
-        self.items_per_page = 50
-        self.total_pages = 1
         
         self.create_widgets()
         self.refresh_all()
 
+    def report_callback_exception(self, exc, val, tb):
+        """Exceptions non traitées des callbacks Tk : une base occupée est signalée, le reste est journalisé."""
+        if isinstance(val, DatabaseBusyError):
+            messagebox.showwarning("Base occupée", str(val), parent=self); return
+        logging.error(f"Erreur non traitée dans l'interface : {val}", exc_info=(exc, val, tb))
+        messagebox.showerror("Erreur Inattendue", f"Une erreur est survenue : {val}", parent=self)
+
     def on_close(self):
         if messagebox.askokcancel("Quitter", "Voulez-vous vraiment quitter ?"):
+            self.executor.shutdown(wait=True) # Les tâches en cours lisent ou écrivent encore la base
             self.db.close()
             self.destroy()
 
@@ -87,21 +103,22 @@ class MainWindow(tk.Tk):
         left_pane = ttk.Frame(main_pane, padding=5); main_pane.add(left_pane, weight=2)
         agents_frame = ttk.LabelFrame(left_pane, text="Agents"); agents_frame.pack(fill=tk.BOTH, expand=True)
         search_frame = ttk.Frame(agents_frame); search_frame.pack(fill=tk.X, padx=5, pady=5); ttk.Label(search_frame, text="Rechercher:").pack(side=tk.LEFT, padx=(0, 5))
-        self.search_var = tk.StringVar(); self.search_var.trace_add("write", lambda *args: self.search_agents())
+        self.search_var = tk.StringVar(); self.search_var.trace_add("write", lambda *args: self.search.on_input(self.search_var.get()))
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var); search_entry.pack(fill=tk.X, expand=True, side=tk.LEFT)
         
         cols_agents = ("ID", "Nom", "Prénom", "PPR", "Grade", "Solde");
-        self.list_agents = ttk.Treeview(agents_frame, columns=cols_agents, show="headings", selectmode="browse")
-        for col in cols_agents: self.list_agents.heading(col, text=col, command=lambda c=col: treeview_sort_column(self.list_agents, c, False))
+        self.agents_view = VirtualTreeview(agents_frame, cols_agents, fetch=self._fetch_agents, count=self._count_agents, seek=self._seek_agents)
+        self.list_agents = self.agents_view.tree
+        for col in cols_agents: self.list_agents.heading(col, text=col, command=lambda c=col: self.sort_agents(c) if c in AGENT_SORT_KEYS else None)
+        update_sort_headings(self.list_agents, AGENT_SORT_KEYS, self.agents_sort)
         self.list_agents.column("ID", width=0, stretch=False); self.list_agents.column("Nom", width=120); self.list_agents.column("Prénom", width=120); self.list_agents.column("PPR", width=80, anchor="center"); self.list_agents.column("Grade", width=100); self.list_agents.column("Solde", width=60, anchor="center")
-        self.list_agents.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.list_agents.bind("<<TreeviewSelect>>", self.on_agent_select)
+        self.agents_view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.agents_view.bind("<<SelectionChanged>>", self.on_agent_select)
         self.list_agents.bind("<Double-1>", lambda e: self.modify_selected_agent())
         
-        pagination_frame = ttk.Frame(agents_frame); pagination_frame.pack(fill=tk.X, padx=5, pady=5)
-        self.prev_button = ttk.Button(pagination_frame, text="<< Précédent", command=self.prev_page); self.prev_button.pack(side=tk.LEFT)
-        self.page_label = ttk.Label(pagination_frame, text="Page 1 / 1"); self.page_label.pack(side=tk.LEFT, expand=True)
-        self.next_button = ttk.Button(pagination_frame, text="Suivant >>", command=self.next_page); self.next_button.pack(side=tk.RIGHT)
+        jump_frame = ttk.Frame(agents_frame); jump_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.letter_var = tk.StringVar(); letter_combo = ttk.Combobox(jump_frame, textvariable=self.letter_var, values=[chr(c) for c in range(ord('A'), ord('Z') + 1)], state="readonly", width=3); letter_combo.pack(side=tk.RIGHT, padx=5); letter_combo.bind("<<ComboboxSelected>>", lambda e: self.jump_to_letter(self.letter_var.get()))
+        ttk.Label(jump_frame, text="Aller à:").pack(side=tk.RIGHT)
         
         btn_frame_agents = ttk.Frame(agents_frame); btn_frame_agents.pack(fill=tk.X, padx=5, pady=(0, 5))
         ttk.Button(btn_frame_agents, text="Ajouter", command=self.add_agent_ui).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
@@ -109,8 +126,9 @@ class MainWindow(tk.Tk):
         ttk.Button(btn_frame_agents, text="Supprimer", command=self.delete_selected_agent).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         
         io_frame_agents = ttk.Frame(agents_frame); io_frame_agents.pack(fill=tk.X, padx=5, pady=(5, 5))
-        ttk.Button(io_frame_agents, text="Importer Agents (Excel)", command=self.import_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
-        ttk.Button(io_frame_agents, text="Exporter Agents (Excel)", command=self.export_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(io_frame_agents, text="Importer Agents", command=self.import_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(io_frame_agents, text="Vérifier un Fichier", command=self.check_import_file).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(io_frame_agents, text="Exporter Agents", command=self.export_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
 
         right_pane = ttk.PanedWindow(main_pane, orient=tk.VERTICAL); main_pane.add(right_pane, weight=3)
         conges_frame = ttk.LabelFrame(right_pane, text="Congés de l'agent sélectionné"); right_pane.add(conges_frame, weight=3)
@@ -120,7 +138,8 @@ class MainWindow(tk.Tk):
         # MODIFICATION : Ajout de la colonne "Date Reprise"
         cols_conges = ("CongeID", "Certificat", "Type", "Début", "Fin", "Date Reprise", "Jours", "Justification", "Intérimaire");
         self.list_conges = ttk.Treeview(conges_frame, columns=cols_conges, show="headings", selectmode="browse")
-        for col in cols_conges: self.list_conges.heading(col, text=col, command=lambda c=col: treeview_sort_column(self.list_conges, c, False))
+        for col in cols_conges: self.list_conges.heading(col, text=col, command=lambda c=col: self.sort_conges(c) if c in CONGE_SORT_KEYS else None)
+        update_sort_headings(self.list_conges, CONGE_SORT_KEYS, self.conges_sort)
         
         # MODIFICATION : Configuration de la nouvelle colonne et ajustement des autres
         self.list_conges.column("CongeID", width=0, stretch=False)
@@ -152,12 +171,34 @@ class MainWindow(tk.Tk):
         ttk.Button(global_actions_frame, text="Suivi Justificatifs", command=self.open_justificatifs_suivi).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(global_actions_frame, text="Gérer les Jours Fériés", command=self.open_holidays_manager).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(global_actions_frame, text="Exporter Tous les Congés", command=self.export_conges).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(global_actions_frame, text="Calendrier des Absences", command=self.open_timeline).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         
-        self.status_var = tk.StringVar(value="Prêt."); status_bar = ttk.Label(self, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W); status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar = ttk.Frame(self, relief=tk.SUNKEN); status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar(value="Prêt."); ttk.Label(status_bar, textvariable=self.status_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Zone des tâches en arrière-plan (affichée seulement quand une tâche est en cours)
+        self.task_var = tk.StringVar()
+        self.task_cancel_button = ttk.Button(status_bar, text="Annuler", command=self.executor.cancel_all)
+        self.task_progress = ttk.Progressbar(status_bar, length=160)
+        self.task_label = ttk.Label(status_bar, textvariable=self.task_var)
+        self.executor.add_listener(self._on_tasks_changed)
+
+    def _on_tasks_changed(self, executor):
+        tasks = [t for t in executor.tasks.values() if not t.silent]
+        if not tasks:
+            for widget in (self.task_cancel_button, self.task_progress, self.task_label): widget.pack_forget()
+            self.task_progress.stop(); return
+        task = tasks[-1]
+        others = f" (+{len(tasks) - 1})" if len(tasks) > 1 else ""
+        self.task_var.set(f"{task.name}{' - ' + task.message if task.message else ''}{others}")
+        if task.total:
+            self.task_progress.stop(); self.task_progress.config(mode="determinate", maximum=task.total, value=task.done)
+        elif str(self.task_progress.cget("mode")) != "indeterminate":
+            self.task_progress.config(mode="indeterminate"); self.task_progress.start(15)
+        for widget in (self.task_cancel_button, self.task_progress, self.task_label):
+            if not widget.winfo_ismapped(): widget.pack(side=tk.RIGHT, padx=2)
 
     def get_selected_agent_id(self):
-        selection = self.list_agents.selection()
-        return int(self.list_agents.item(selection[0])["values"][0]) if selection else None
+        return self.agents_view.selected_id
 
     def get_selected_conge_id(self):
         selection = self.list_conges.selection()
@@ -193,74 +234,87 @@ class MainWindow(tk.Tk):
     def export_agents(self): export_agents_to_excel(self, self.db)
     def export_conges(self): export_all_conges_to_excel(self, self.db)
     def import_agents(self): import_agents_from_excel(self, self.db)
+    def check_import_file(self): import_agents_from_excel(self, self.db, dry_run=True)
     
     # CORRECTION : Passer le manager complet à HolidaysManagerWindow
     def open_holidays_manager(self): HolidaysManagerWindow(self, self.manager)
     
     # CORRECTION : S'assurer que JustificatifsWindow reçoit bien le db_manager
     def open_justificatifs_suivi(self): JustificatifsWindow(self, self.manager.db)
+    def open_timeline(self): TimelineWindow(self, self.manager)
 
     def refresh_all(self, agent_to_select_id=None):
         current_selection = agent_to_select_id or self.get_selected_agent_id()
         self.refresh_agents_list(current_selection)
         self.refresh_stats()
 
+    def _fetch_agents(self, offset, limit):
+        """Bloc de lignes de la liste virtuelle des agents (résultat de recherche en mémoire, sinon la base)."""
+        if self.search_rows is not None:
+            return [(r[0], r[1], r[2], r[3], r[4], f"{r[5]:.1f}") for r in self.search_rows[offset:offset + limit]]
+        return self._agent_rows(self.db.get_agents(self.search_term, limit=limit, offset=offset, order_by=self.agents_sort[0], descending=self.agents_sort[1]))
+
+    def _seek_agents(self, key, limit, backwards):
+        """Bloc voisin lu par clé (pagination par clé de la base) ; None pour un résultat de recherche en mémoire."""
+        if self.search_rows is not None: return None
+        bound = {'before' if backwards else 'after': key}
+        return self._agent_rows(self.db.get_agents(self.search_term, limit=limit, order_by=self.agents_sort[0], descending=self.agents_sort[1], **bound))
+
+    def _agent_rows(self, agents):
+        """Lignes affichées, suivies de la clé de tri de l'agent (pagination par clé)."""
+        key = self.agents_sort[0]
+        return [(a.id, a.nom, a.prenom, a.ppr, a.grade, f"{a.solde:.1f}", agent_sort_key(a, key)) for a in agents]
+
+    def _count_agents(self):
+        return len(self.search_rows) if self.search_rows is not None else self.db.get_agents_count(self.search_term)
+
+    def _agent_index(self, agent_id):
+        if self.search_rows is not None: return self._search_positions.get(agent_id)
+        return self.db.get_agent_index(agent_id, self.search_term, *self.agents_sort)
+
     def refresh_agents_list(self, agent_to_select_id=None):
-        for row in self.list_agents.get_children(): self.list_agents.delete(row)
-        term = self.search_var.get().strip().lower() or None
-        total_items = self.manager.db.get_agents_count(term)
-        self.total_pages = max(1, (total_items + self.items_per_page - 1) // self.items_per_page)
-        self.current_page = min(self.current_page, self.total_pages)
-        offset = (self.current_page - 1) * self.items_per_page
-        agents = self.manager.get_all_agents(term=term, limit=self.items_per_page, offset=offset)
-
-        selected_item_id = None
-        for agent in agents:
-            item_id = self.list_agents.insert("", "end", values=(agent.id, agent.nom, agent.prenom, agent.ppr, agent.grade, f"{agent.solde:.1f}"))
-            if agent.id == agent_to_select_id:
-                selected_item_id = item_id
-
-        if selected_item_id:
-            self.list_agents.selection_set(selected_item_id)
-            self.list_agents.focus(selected_item_id)
+        # Avec un terme de recherche, la liste est rafraîchie à l'arrivée du résultat (_on_search_results)
+        self.search.search_now(self.search_var.get(), agent_to_select_id)
+
+    def _on_search_results(self, rows, select_id=None, scroll_top=False, term=None):
+        self.search_rows, self.search_term = rows, term
+        self._search_positions = {r[0]: i for i, r in enumerate(rows)} if rows is not None else {}
+        if scroll_top: self.agents_view.offset = 0
+        self.agents_view.refresh(select_id, index_of=self._agent_index)
         self.on_agent_select()
-        
-        self.page_label.config(text=f"Page {self.current_page} / {self.total_pages}")
-        self.prev_button.config(state="normal" if self.current_page > 1 else "disabled")
-        self.next_button.config(state="normal" if self.current_page < self.total_pages else "disabled")
-        self.set_status(f"{len(agents)} agents affichés sur {total_items} au total.")
+        self.set_status(f"{self.agents_view.total} agents trouvés." if rows is not None else f"{self.agents_view.total} agents au total.")
 
     def refresh_conges_list(self, agent_id):
         self.list_conges.delete(*self.list_conges.get_children())
         filtre = self.conge_filter_var.get()
-        conges_data = self.manager.get_conges_for_agent(agent_id)
+        # Une seule requête : certificats et noms des intérimaires sont joints, le filtre est appliqué en SQL
+        conges_data = self.db.get_conges_view(agent_id, filtre, *self.conges_sort)
         
         conges_par_annee = defaultdict(list)
-        for c in conges_data:
-            if filtre != "Tous" and c.type_conge != filtre: continue
+        for row in conges_data:
             try:
-                conges_par_annee[c.date_debut.year].append(c)
+                conges_par_annee[row[0].date_debut.year].append(row)
             except AttributeError:
-                logging.warning(f"Date invalide ou nulle pour congé ID {c.id}")
+                logging.warning(f"Date invalide ou nulle pour congé ID {row[0].id}")
         
+        # Totaux annuels lus dans la table de synthèse conges_summary (maintenue par triggers)
+        jours_annuels = self.db.get_jours_pris_par_annee(agent_id) if filtre in ("Tous", "Congé annuel") else {}
         for annee in sorted(conges_par_annee.keys(), reverse=True):
-            total_jours = sum(c.jours_pris for c in conges_par_annee[annee] if c.type_conge == 'Congé annuel' and c.statut == 'Actif')
+            total_jours = jours_annuels.get(annee, 0)
             # MODIFICATION : Ajout d'une colonne vide pour la date de reprise dans le résumé annuel
             summary_id = self.list_conges.insert("", "end", values=("", "", f"📅 ANNÉE {annee}", "", "", "", total_jours, f"{total_jours} jours pris", ""), tags=("summary",), open=True)
             
             # MODIFICATION : Charger les jours fériés une fois par année pour optimiser
             holidays_set = get_holidays_set_for_period(self.db, annee, annee + 1)
 
-            for conge in sorted(conges_par_annee[annee], key=lambda c: c.date_debut):
+            for conge, has_cert, interim_nom in conges_par_annee[annee]:
                 cert_status = ""
                 if conge.type_conge == 'Congé de maladie':
-                    cert = self.db.get_certificat_for_conge(conge.id)
-                    cert_status = "✅ Justifié" if cert else "❌ Manquant"
+                    cert_status = "✅ Justifié" if has_cert else "❌ Manquant"
                 
                 interim_info = ""
                 if conge.interim_id:
-                    interim = self.manager.get_agent_by_id(conge.interim_id)
-                    interim_info = f"{interim.nom} {interim.prenom}" if interim else "Agent Supprimé"
+                    interim_info = interim_nom or "Agent Supprimé"
                 
                 tags_a_appliquer = ('annule',) if conge.statut == 'Annulé' else ()
                 
@@ -282,23 +336,34 @@ class MainWindow(tk.Tk):
                 ), tags=tags_a_appliquer)
 
     def refresh_stats(self):
+        """Les agrégats sont calculés en arrière-plan ; le panneau est mis à jour à leur arrivée."""
+        self._stats_generation = generation = self._stats_generation + 1
+        self.executor.submit("Statistiques", lambda ctx: self.stats_service.get_global_stats(),
+                             on_success=lambda stats: self._show_stats(stats, generation),
+                             on_error=lambda e: self._show_stats(e, generation), silent=True)
+
+    def _show_stats(self, stats, generation):
+        if generation != self._stats_generation: return # Résultat d'une actualisation dépassée
         self.text_stats.config(state=tk.NORMAL)
         self.text_stats.delete("1.0", tk.END)
         try:
-            all_conges = self.manager.db.get_conges()
-            nb_agents = self.manager.db.get_agents_count()
+            if isinstance(stats, Exception): raise stats
+            nb_conges = stats['nb_conges']
 
-            active_conges = [c for c in all_conges if c.statut == 'Actif']
-            total_jours_pris = sum(c.jours_pris for c in active_conges)
-            
-            self.text_stats.insert(tk.END, f"{'Nombre total d\'agents':<25}: {nb_agents}\n")
-            self.text_stats.insert(tk.END, f"{'Total des jours de congés actifs':<25}: {total_jours_pris}\n\n")
+            self.text_stats.insert(tk.END, "Nombre total d'agents".ljust(25) + f": {stats['nb_agents']}\n")
+            self.text_stats.insert(tk.END, f"{'Total des jours de congés actifs':<25}: {stats['total_jours']}\n\n")
             self.text_stats.insert(tk.END, "Répartition par type de congé (actifs):\n")
-            
-            if active_conges:
-                for type_conge, count in Counter(c.type_conge for c in active_conges).most_common():
-                    self.text_stats.insert(tk.END, f"  - {type_conge:<22}: {count} ({(count / len(active_conges)) * 100:.1f}%)\n")
-        except sqlite3.Error as e:
+            for type_conge, count, jours in stats['par_type']:
+                self.text_stats.insert(tk.END, f"  - {type_conge:<22}: {count} ({(count / nb_conges) * 100:.1f}%)\n")
+
+            self.text_stats.insert(tk.END, "\nRépartition par grade (actifs):\n")
+            for grade, count, jours in stats['par_grade']:
+                self.text_stats.insert(tk.END, f"  - {grade:<22}: {count} congés, {jours} jours\n")
+
+            self.text_stats.insert(tk.END, f"\nRépartition par mois ({stats['annee']}):\n")
+            for mois, count, jours in stats['par_mois']:
+                self.text_stats.insert(tk.END, f"  - {MOIS[mois - 1]:<22}: {count} congés, {jours} jours\n")
+        except Exception as e:
             self.text_stats.insert(tk.END, f"Erreur de lecture des statistiques: {e}")
         finally:
             self.text_stats.config(state=tk.DISABLED)
@@ -320,15 +385,29 @@ class MainWindow(tk.Tk):
         else:
              self.modify_selected_conge()
 
-    def search_agents(self):
-        self.current_page = 1; self.refresh_agents_list()
     def on_agent_select(self, event=None):
         agent_id = self.get_selected_agent_id()
         if agent_id:
             self.refresh_conges_list(agent_id)
         else:
             self.list_conges.delete(*self.list_conges.get_children())
-    def prev_page(self):
-        if self.current_page > 1: self.current_page -= 1; self.refresh_agents_list(self.get_selected_agent_id())
-    def next_page(self):
-        if self.current_page < self.total_pages: self.current_page += 1; self.refresh_agents_list(self.get_selected_agent_id())
\ No newline at end of file
+    def jump_to_letter(self, letter):
+        key, descending = self.agents_sort
+        if not letter or key in ('solde', 'ppr'): return # Clés numériques : pas de saut par lettre
+        # En ordre décroissant, les noms commençant par la lettre suivent ceux qui sont >= à la lettre suivante.
+        # Le tri ignore la casse (NOCASE compare en minuscules) : la borne est en minuscule, « z » + 1 = « { ».
+        letter = letter.lower()
+        bound = chr(ord(letter) + 1) if descending else letter
+        if self.search_rows is not None: index = count_rows_before(self.search_rows, bound, key, descending)
+        else: index = self.db.count_agents_before((bound,), self.search_term, key, descending)
+        self.agents_view.scroll_to(index)
+    def sort_agents(self, col):
+        key = AGENT_SORT_KEYS[col]
+        self.agents_sort = (key, not self.agents_sort[1] if self.agents_sort[0] == key else False)
+        update_sort_headings(self.list_agents, AGENT_SORT_KEYS, self.agents_sort)
+        self.refresh_agents_list(self.get_selected_agent_id())
+    def sort_conges(self, col):
+        key = CONGE_SORT_KEYS[col]
+        self.conges_sort = (key, not self.conges_sort[1] if self.conges_sort[0] == key else False)
+        update_sort_headings(self.list_conges, CONGE_SORT_KEYS, self.conges_sort)
+        self.on_agent_select()
\ No newline at end of file
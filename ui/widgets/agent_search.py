@@ -0,0 +1,142 @@
+# ui/widgets/agent_search.py
+import re
+import logging
+from collections import OrderedDict
+
+from db.database import AGENT_SORT_COLUMNS
+from utils.text_utils import normalize_search_text
+
+# Mots au sens du tokenizer FTS5 unicode61 : lettres et chiffres, « _ » est un séparateur
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_LEADING_INT_RE = re.compile(r'\s*([+-]?\d+)')
+
+def _sql_integer(value):
+    """Équivalent de CAST(value AS INTEGER) : entier en tête du texte, 0 s'il n'y en a pas."""
+    match = _LEADING_INT_RE.match(value or "")
+    return int(match.group(1)) if match else 0
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _nocase(value):
+    """Équivalent de COLLATE NOCASE : seules les lettres ASCII sont passées en minuscules."""
+    return (value or "").translate(_ASCII_LOWER)
+
+# Expression de tri SQL -> (position dans la ligne, conversion appliquée par SQLite)
+_SORT_EXPRESSIONS = {
+    "agents.id": (0, None), "agents.nom COLLATE NOCASE": (1, _nocase), "agents.prenom COLLATE NOCASE": (2, _nocase),
+    "agents.ppr": (3, None), "CAST(agents.ppr AS INTEGER)": (3, _sql_integer),
+    "agents.grade COLLATE NOCASE": (4, _nocase), "agents.solde": (5, None),
+}
+
+def _sort_key(expression):
+    i, convert = _SORT_EXPRESSIONS[expression]
+    return (lambda r: convert(r[i])) if convert else (lambda r: r[i])
+
+
+def search_tokens(text):
+    return tuple(_TOKEN_RE.findall(normalize_search_text(text)))
+
+def _matches(row_tokens, tokens):
+    """Même règle que la requête FTS : chaque mot cherché est le préfixe d'au moins un mot de l'agent."""
+    return all(any(w.startswith(t) for w in row_tokens) for t in tokens)
+
+def _narrows(parent, tokens):
+    """Vrai si tout résultat de `tokens` est aussi un résultat de `parent` (recherche affinée)."""
+    return all(any(t.startswith(p) for t in tokens) for p in parent)
+
+def sort_rows(rows, order_by, descending):
+    """Trie en mémoire des lignes (id, nom, prénom, ppr, grade, solde, ...) comme le ferait get_agents."""
+    keys = [_sort_key(col) for col in AGENT_SORT_COLUMNS[order_by] + ("agents.id",)]
+    return sorted(rows, key=lambda r: tuple(k(r) for k in keys), reverse=descending)
+
+def count_rows_before(rows, bound, order_by, descending):
+    """Position de `bound` (valeur de la première colonne du tri) dans des lignes triées par sort_rows."""
+    expression = AGENT_SORT_COLUMNS[order_by][0]
+    key, convert = _sort_key(expression), _SORT_EXPRESSIONS[expression][1]
+    if convert: bound = convert(bound)
+    return sum(1 for r in rows if (key(r) > bound if descending else key(r) < bound))
+
+
+class AgentSearchController:
+    """
+    Recherche incrémentale des agents : la saisie est temporisée (after), la requête tourne hors du thread Tk
+    et seul le résultat de la dernière saisie est livré (numéro de génération). Les derniers résultats sont gardés
+    en cache (LRU, vidé dès que la base change) ; une recherche qui affine un terme en cache (« ben » -> « benn »)
+    filtre ces résultats en mémoire au lieu d'interroger la base. Au-delà de MAX_ROWS résultats, rien n'est gardé
+    en mémoire : la liste lit alors la base page par page avec le terme de recherche.
+    on_results(lignes triées ou None, select_id, scroll_top, terme) est appelé dans le thread Tk ; lignes None avec
+    un terme : trop de résultats, None sans terme : recherche vide.
+    """
+    DELAY_MS = 250
+    CACHE_SIZE = 8
+    MAX_ROWS = 5000
+
+    def __init__(self, widget, executor, db_manager, on_results, get_sort):
+        self.widget, self.executor, self.db = widget, executor, db_manager
+        self.on_results, self.get_sort = on_results, get_sort
+        self._cache = OrderedDict()   # mots cherchés -> lignes (id, nom, prénom, ppr, grade, solde, mots de l'agent)
+        self._cache_version = None
+        self._generation = 0
+        self._pending = None          # identifiant after() de la recherche temporisée
+        self._task = None
+
+    def on_input(self, term):
+        """À appeler à chaque frappe : la recherche ne part qu'après DELAY_MS sans nouvelle saisie."""
+        if self._pending: self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.DELAY_MS, lambda: self.search_now(term, scroll_top=True))
+
+    def search_now(self, term, select_id=None, scroll_top=False):
+        """Lance la recherche immédiatement (rafraîchissement, changement de tri)."""
+        if self._pending: self.widget.after_cancel(self._pending); self._pending = None
+        self._generation += 1
+        generation = self._generation
+        if self._task: self._task.cancel(); self._task = None
+        tokens = search_tokens(term)
+        if not tokens:
+            self.on_results(None, select_id, scroll_top, None); return
+
+        version = self.db.data_version()
+        if version != self._cache_version: self._cache.clear(); self._cache_version = version
+        cached, parent_rows = self._cache.get(tokens), None
+        if cached is not None:
+            self._cache.move_to_end(tokens)
+        elif '_' not in normalize_search_text(term): # FTS traite « a_b » comme une expression : pas de filtrage en mémoire
+            parent = max((k for k in self._cache if _narrows(k, tokens)), key=lambda k: sum(map(len, k)), default=None)
+            parent_rows = self._cache[parent] if parent else None
+        order_by, descending = self.get_sort()
+
+        def task(ctx):
+            if cached is not None: rows = cached
+            elif parent_rows is not None: rows = [r for r in parent_rows if _matches(r[6], tokens)]
+            else: rows = self._query(term)
+            ctx.check_cancelled()
+            return rows, sort_rows(rows, order_by, descending) if rows is not None else None
+
+        self._task = self.executor.submit(
+            "Recherche d'agents", task, silent=True,
+            on_success=lambda result: self._deliver(generation, term, tokens, version, result, select_id, scroll_top),
+            on_error=lambda e: self._on_error(generation, e))
+
+    def _query(self, term):
+        """Résultats de la recherche, ou None s'il y en a plus de MAX_ROWS."""
+        agents = self.db.get_agents(term=term, limit=self.MAX_ROWS + 1)
+        if len(agents) > self.MAX_ROWS: return None
+        rows = []
+        for agent in agents:
+            rows.append((agent.id, agent.nom, agent.prenom, agent.ppr, agent.grade, agent.solde,
+                         search_tokens(f"{agent.nom} {agent.prenom} {agent.ppr}")))
+        return rows
+
+    def _deliver(self, generation, term, tokens, version, result, select_id, scroll_top):
+        if generation != self._generation: return # L'utilisateur a continué de taper : résultat périmé
+        self._task = None
+        rows, sorted_rows = result
+        if rows is not None and version == self._cache_version:
+            self._cache[tokens] = rows; self._cache.move_to_end(tokens)
+            while len(self._cache) > self.CACHE_SIZE: self._cache.popitem(last=False)
+        self.on_results(sorted_rows, select_id, scroll_top, term)
+
+    def _on_error(self, generation, e):
+        if generation != self._generation: return
+        self._task = None
+        logging.error(f"Échec de la recherche d'agents : {e}", exc_info=e)
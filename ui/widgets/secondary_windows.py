@@ -10,6 +10,7 @@ from ui.widgets.date_picker import DatePickerWindow
 from utils.date_utils import validate_date, format_date_for_display, jours_ouvres, get_holidays_set_for_period
 from db.models import Conge
 from utils.config_loader import CONFIG
+from utils.task_executor import TaskCancelled
 
 class HolidaysManagerWindow(tk.Toplevel):
     def __init__(self, parent, conge_manager):
@@ -55,6 +56,9 @@ class HolidaysManagerWindow(tk.Toplevel):
         actions_frame = ttk.LabelFrame(main_frame, text="Actions"); actions_frame.pack(fill="x", expand=True, pady=5, padx=5)
         ttk.Button(actions_frame, text="Restaurer les jours automatiques pour cette année", command=self.restore_auto_holidays).pack(side="top", fill="x", padx=5, pady=5)
         ttk.Button(actions_frame, text="Vérifier la cohérence des congés annuels", command=self.audit_annual_leaves).pack(side="top", fill="x", padx=5, pady=5)
+        io_frame = ttk.Frame(actions_frame); io_frame.pack(side="top", fill="x", padx=3, pady=(0, 5))
+        ttk.Button(io_frame, text="Importer des jours fériés", command=self.import_holidays).pack(side="left", expand=True, fill="x", padx=2)
+        ttk.Button(io_frame, text="Exporter les jours fériés", command=self.export_holidays).pack(side="left", expand=True, fill="x", padx=2)
 
         bottom_frame = ttk.LabelFrame(main_frame, text="Ajouter un Jour Férié Personnalisé"); bottom_frame.pack(fill="x", expand=True, pady=5, padx=5)
         add_frame = ttk.Frame(bottom_frame, padding=5); add_frame.pack()
@@ -65,8 +69,24 @@ class HolidaysManagerWindow(tk.Toplevel):
 
     def audit_annual_leaves(self):
         year = int(self.year_var.get())
-        messagebox.showinfo("Analyse en cours", f"Vérification des congés annuels pour l'année {year}...", parent=self)
-        inconsistencies = self.manager.find_inconsistent_annual_leaves(year)
+        self.master.executor.submit(f"Vérification des congés {year}", lambda ctx: self.manager.find_inconsistent_annual_leaves(year),
+                                    on_success=lambda inconsistencies: self._show_audit_report(year, inconsistencies),
+                                    on_error=self._show_audit_error)
+
+    def import_holidays(self):
+        from utils.file_utils import import_holidays_from_file # Import local : file_utils importe ce module
+        import_holidays_from_file(self, self.master.executor, self.db, on_done=lambda: self.winfo_exists() and self.refresh_holidays_list())
+
+    def export_holidays(self):
+        from utils.file_utils import export_dataset
+        export_dataset(self, self.master.executor, self.db, 'jours_feries', "Exporter les jours fériés", f"Jours_Feries_{datetime.now().strftime('%Y-%m-%d')}.csv")
+
+    def _show_audit_error(self, error):
+        if not self.winfo_exists() or isinstance(error, TaskCancelled): return
+        messagebox.showerror("Erreur", f"La vérification des congés a échoué : {error}", parent=self)
+
+    def _show_audit_report(self, year, inconsistencies):
+        if not self.winfo_exists(): return
         if not inconsistencies:
             messagebox.showinfo("Rapport d'audit", f"Aucune incohérence trouvée pour {year}.\nTous les congés annuels sont corrects.", parent=self); return
         ReportWindow(self, year, inconsistencies)
@@ -125,7 +145,12 @@ class JustificatifsWindow(tk.Toplevel):
     def _create_widgets(self):
         main_frame = ttk.Frame(self, padding=10); main_frame.pack(fill="both", expand=True); cols = ("Agent", "PPR", "Date Début", "Date Fin", "Jours Pris"); self.tree = ttk.Treeview(main_frame, columns=cols, show="headings", height=10)
         for col in cols: self.tree.heading(col, text=col); self.tree.column(col, width=120)
-        self.tree.pack(fill="both", expand=True, padx=5, pady=5); ttk.Button(main_frame, text="Actualiser", command=self.refresh_list).pack(pady=5)
+        self.tree.pack(fill="both", expand=True, padx=5, pady=5)
+        btn_frame = ttk.Frame(main_frame); btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Actualiser", command=self.refresh_list).pack(side="left", padx=2); ttk.Button(btn_frame, text="Exporter les certificats", command=self.export_certificats).pack(side="left", padx=2)
+    def export_certificats(self):
+        from utils.file_utils import export_dataset # Import local : file_utils importe ce module
+        export_dataset(self, self.master.executor, self.db, 'certificats', "Exporter les certificats médicaux", f"Certificats_{datetime.now().strftime('%Y-%m-%d')}.csv")
     def refresh_list(self):
         for row in self.tree.get_children(): self.tree.delete(row)
         try:
@@ -145,4 +170,142 @@ class ReportWindow(tk.Toplevel):
         for conge, recalculated_days in inconsistencies:
             agent = parent.db.get_agent_by_id(conge.agent_id); agent_name = f"{agent.nom} {agent.prenom}" if agent else "Agent Inconnu"
             tree.insert("", "end", values=(agent_name, conge.date_debut.strftime('%d/%m/%Y'), conge.date_fin.strftime('%d/%m/%Y'), conge.jours_pris, recalculated_days), tags=("error",))
-        tree.pack(fill="both", expand=True); ttk.Button(main_frame, text="Fermer", command=self.destroy).pack(pady=10)
\ No newline at end of file
+        tree.pack(fill="both", expand=True); ttk.Button(main_frame, text="Fermer", command=self.destroy).pack(pady=10)
+
+class ImportReportWindow(tk.Toplevel):
+    """Rapport d'importation affichant la liste complète des erreurs détectées."""
+    def __init__(self, parent, summary, errors):
+        super().__init__(parent); self.title("Rapport d'importation"); self.grab_set(); self.geometry("700x450")
+        main_frame = ttk.Frame(self, padding=10); main_frame.pack(fill="both", expand=True)
+        ttk.Label(main_frame, text=summary, wraplength=650, justify="left").pack(fill="x", pady=(0, 10))
+        text_frame = ttk.Frame(main_frame); text_frame.pack(fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(text_frame, orient="vertical"); scrollbar.pack(side="right", fill="y")
+        text = tk.Text(text_frame, wrap="none", font=('Courier New', 10), yscrollcommand=scrollbar.set); text.pack(side="left", fill="both", expand=True)
+        scrollbar.config(command=text.yview)
+        text.insert("1.0", "\n".join(errors)); text.config(state="disabled")
+        ttk.Button(main_frame, text="Fermer", command=self.destroy).pack(pady=10)
+
+class TimelineWindow(tk.Toplevel):
+    """Nombre d'agents absents / présents par jour sur une période, avec les jours de pointe."""
+    GROUPES = {"Aucun": None, "Grade": 'grade', "Type de congé": 'type'}
+
+    def __init__(self, parent, conge_manager):
+        super().__init__(parent); self.manager = conge_manager; self.db = conge_manager.db; self.timeline = None; self._generation = 0
+        self.title("Calendrier des Absences"); self.geometry("900x600"); self._create_widgets()
+
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self, padding=10); main_frame.pack(fill="both", expand=True)
+        params = ttk.Frame(main_frame); params.pack(fill="x", pady=(0, 5))
+        year = datetime.now().year
+        ttk.Label(params, text="Du:").pack(side="left"); self.start_entry = ttk.Entry(params, width=12); self.start_entry.insert(0, f"01/01/{year}"); self.start_entry.pack(side="left", padx=2)
+        ttk.Button(params, text="📅", width=2, command=lambda: DatePickerWindow(self, self.start_entry, self.db)).pack(side="left")
+        ttk.Label(params, text="Au:").pack(side="left", padx=(10, 0)); self.end_entry = ttk.Entry(params, width=12); self.end_entry.insert(0, f"31/12/{year}"); self.end_entry.pack(side="left", padx=2)
+        ttk.Button(params, text="📅", width=2, command=lambda: DatePickerWindow(self, self.end_entry, self.db)).pack(side="left")
+        ttk.Label(params, text="Répartition:").pack(side="left", padx=(10, 2))
+        self.group_var = tk.StringVar(value="Aucun"); ttk.Combobox(params, textvariable=self.group_var, values=list(self.GROUPES), state="readonly", width=14).pack(side="left")
+        ttk.Button(params, text="Calculer", command=self.compute).pack(side="left", padx=10)
+        ttk.Button(params, text="Exporter (Excel)", command=self.export).pack(side="right")
+
+        self.peak_label = ttk.Label(main_frame, text="", wraplength=850, justify="left"); self.peak_label.pack(fill="x", pady=5)
+        tree_frame = ttk.Frame(main_frame); tree_frame.pack(fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical"); scrollbar.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(tree_frame, show="headings", yscrollcommand=scrollbar.set); self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.config(command=self.tree.yview)
+        self.tree.tag_configure("peak", background="#FFDDDD")
+
+    def compute(self):
+        start, end = validate_date(self.start_entry.get()), validate_date(self.end_entry.get())
+        if not start or not end:
+            messagebox.showerror("Erreur", "Dates invalides (format JJ/MM/AAAA).", parent=self); return
+        self._generation += 1; generation, group = self._generation, self.GROUPES[self.group_var.get()]
+        self.peak_label.config(text="Calcul en cours...")
+        self.master.executor.submit("Chronologie des absences", lambda ctx: self.manager.get_absence_timeline(start, end, group),
+                                    on_success=lambda timeline: self._show_timeline(timeline, generation),
+                                    on_error=lambda e: self._show_timeline(e, generation))
+
+    def _show_timeline(self, timeline, generation):
+        """Retour du calcul (thread Tk) : ignoré si la fenêtre est fermée ou si un calcul plus récent a été lancé."""
+        if generation != self._generation or not self.winfo_exists(): return
+        if isinstance(timeline, Exception):
+            self.peak_label.config(text=""); messagebox.showerror("Erreur", str(timeline), parent=self); return
+        self.timeline = timeline
+        cols = self.timeline_headers()
+        self.tree.delete(*self.tree.get_children()); self.tree["columns"] = cols
+        for col in cols: self.tree.heading(col, text=col); self.tree.column(col, width=110, anchor="center")
+        peaks = self.timeline.peak_days(5); peak_days = {d for d, _ in peaks}
+        for row in self.timeline.rows():
+            self.tree.insert("", "end", values=(row[0].strftime("%d/%m/%Y"), *row[1:]), tags=("peak",) if row[0] in peak_days else ())
+        peaks_str = ", ".join(f"{d.strftime('%d/%m/%Y')} ({n})" for d, n in peaks) or "aucune absence"
+        self.peak_label.config(text=f"Effectif : {self.timeline.nb_agents} agents. Jours de pointe : {peaks_str}")
+
+    def timeline_headers(self):
+        groupes = self.timeline.groupes
+        presents = [f"Présents - {g}" for g in groupes] if self.timeline.effectifs_groupe else []
+        return ["Date", "Absents", "Présents"] + [f"Absents - {g}" for g in groupes] + presents
+
+    def export(self):
+        if not self.timeline:
+            messagebox.showinfo("Information", "Calculez d'abord la chronologie.", parent=self); return
+        from utils.file_utils import export_timeline_to_excel # Import local : file_utils importe ce module
+        export_timeline_to_excel(self, self.master.executor, self.timeline, self.timeline_headers())
+
+class ProgressWindow(tk.Toplevel):
+    """
+    Soumet task(progress, cancelled) à l'exécuteur de tâches et affiche sa progression.
+    ProgressWindow.run(...) attend la fin (l'interface reste réactive) puis retourne le résultat ou relève l'exception.
+    """
+    def __init__(self, parent, title, task, executor):
+        super().__init__(parent); self.title(title); self.resizable(False, False); self.grab_set()
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.result, self.error = None, None
+        main_frame = ttk.Frame(self, padding=10); main_frame.pack(fill="both", expand=True)
+        self.label = ttk.Label(main_frame, text="Copie en cours...", width=40); self.label.pack(fill="x")
+        self.bar = ttk.Progressbar(main_frame, length=300, mode="determinate", maximum=1); self.bar.pack(fill="x", pady=5)
+        ttk.Button(main_frame, text="Annuler", command=self.cancel).pack()
+        self.task = executor.submit(title, lambda ctx: task(lambda done, total: ctx.progress(done, total), ctx.cancelled),
+                                    on_success=self._finish, on_error=lambda e: self._finish(None, e), on_progress=self._progress)
+
+    def _progress(self, done, total, message=None):
+        if total:
+            self.bar.config(maximum=total, value=done); self.label.config(text=f"{done / 1048576:.1f} / {total / 1048576:.1f} Mo")
+
+    def _finish(self, result, error=None):
+        self.result, self.error = result, error
+        self.destroy()
+
+    def cancel(self):
+        self.task.cancel(); self.label.config(text="Annulation...")
+
+    @classmethod
+    def run(cls, parent, title, task, executor):
+        window = cls(parent, title, task, executor)
+        parent.wait_window(window)
+        if window.error: raise window.error
+        return window.result
+
+class ExportFiltersDialog(tk.Toplevel):
+    """Choix des filtres de l'export des congés (année, type, grade). ask() retourne un dict ou None si annulé."""
+    TOUS = "Tous"
+
+    def __init__(self, parent, years, types, grades):
+        super().__init__(parent); self.title("Filtres de l'export"); self.resizable(False, False); self.grab_set()
+        self.result = None
+        main_frame = ttk.Frame(self, padding=10); main_frame.pack(fill="both", expand=True)
+        self.vars = {}
+        for row, (key, label, values) in enumerate((('year', "Année :", years), ('type_conge', "Type de congé :", types), ('grade', "Grade :", grades))):
+            ttk.Label(main_frame, text=label).grid(row=row, column=0, sticky="w", pady=2)
+            self.vars[key] = tk.StringVar(value=self.TOUS)
+            ttk.Combobox(main_frame, textvariable=self.vars[key], values=[self.TOUS] + [str(v) for v in values], state="readonly", width=25).grid(row=row, column=1, padx=5, pady=2)
+        btn_frame = ttk.Frame(main_frame); btn_frame.grid(row=3, column=0, columnspan=2, pady=(10, 0))
+        ttk.Button(btn_frame, text="Exporter", command=self._on_ok).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Annuler", command=self.destroy).pack(side="left", padx=5)
+
+    def _on_ok(self):
+        self.result = {key: (None if var.get() == self.TOUS else var.get()) for key, var in self.vars.items()}
+        self.destroy()
+
+    @classmethod
+    def ask(cls, parent, years, types, grades):
+        dialog = cls(parent, years, types, grades)
+        parent.wait_window(dialog)
+        return dialog.result
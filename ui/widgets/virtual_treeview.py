@@ -0,0 +1,167 @@
+# ui/widgets/virtual_treeview.py
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Liste à défilement virtuel : seules les lignes visibles existent dans le Treeview.
+    Les données sont lues par blocs (tuples dont la première valeur est l'identifiant) et count() donne le total ;
+    quelques blocs voisins restent en cache. Avec seek(clé, limit, backwards), un bloc voisin d'un bloc en cache est lu
+    par clé depuis sa dernière (ou première) ligne, à coût constant ; la clé d'une ligne est la valeur qui suit les
+    colonnes affichées. fetch(offset, limit) ne sert qu'aux sauts sans voisin en cache (ou si seek renvoie None).
+    La sélection est suivie par identifiant et non par ligne Tk, elle survit donc au défilement et aux
+    rafraîchissements. Un changement de sélection par l'utilisateur émet l'événement virtuel <<SelectionChanged>>.
+    """
+    BLOCK_SIZE = 200
+    MAX_BLOCKS = 8
+
+    def __init__(self, parent, columns, fetch, count, seek=None, **tree_options):
+        super().__init__(parent)
+        self.fetch, self.count, self.seek = fetch, count, seek
+        self._width = len(columns)        # les valeurs suivantes d'une ligne (clé de tri) ne sont pas affichées
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse", **tree_options)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.total = 0
+        self.offset = 0                   # index de la première ligne affichée
+        self.visible_rows = 1
+        self.selected_id = None
+        self.selected_index = None        # position de l'élément sélectionné dans la liste complète
+        self._items = []                  # lignes Tk réutilisées d'un affichage à l'autre
+        self._blocks = OrderedDict()      # cache LRU : n° de bloc -> lignes
+        self._index_of = None
+
+        self.tree.bind("<Configure>", lambda e: self._on_resize())
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page"), ("<Home>", "home"), ("<End>", "end")):
+            self.tree.bind(key, lambda e, s=step: self._move_selection(s) or "break")
+
+    # --- Données ---
+    def refresh(self, select_id=None, index_of=None):
+        """
+        Relit le total et vide le cache (données modifiées, nouveau filtre, nouveau tri). La position de défilement est
+        conservée. index_of(id) -> position ou None : retrouve select_id pour l'amener à l'écran ; l'élément déjà
+        sélectionné n'est cherché (index_of) que s'il n'est pas dans la zone visible.
+        """
+        self._blocks.clear()
+        self.total, self._index_of = self.count(), index_of
+        if select_id is not None:
+            index = index_of(select_id) if index_of else None
+            self.selected_id, self.selected_index = (select_id, index) if index is not None else (None, None)
+            if index is not None: self.see_index(index, render=False)
+        else:
+            self.selected_index = None # Retrouvée par _render si l'élément est visible
+        self.offset = max(0, min(self.offset, self.total - self.visible_rows))
+        self._render()
+        if self.selected_id is not None and self.selected_index is None:
+            index = index_of(self.selected_id) if index_of else None
+            if index is None: self.selected_id = None # Sorti de la liste (supprimé, filtré)
+            else: self.selected_index = index
+
+    def _load_block(self, block_no):
+        """Lit un bloc par clé depuis un bloc voisin en cache, sinon par position."""
+        if self.seek:
+            previous, following = self._blocks.get(block_no - 1), self._blocks.get(block_no + 1)
+            if previous and len(previous) == self.BLOCK_SIZE:
+                block = self.seek(previous[-1][self._width], self.BLOCK_SIZE, False)
+                if block is not None: return block
+            if following:
+                block = self.seek(following[0][self._width], self.BLOCK_SIZE, True)
+                if block is not None and len(block) == self.BLOCK_SIZE: return block
+        return self.fetch(block_no * self.BLOCK_SIZE, self.BLOCK_SIZE)
+
+    def _row(self, index):
+        block_no, pos = divmod(index, self.BLOCK_SIZE)
+        block = self._blocks.get(block_no)
+        if block is None:
+            block = self._load_block(block_no)
+            self._blocks[block_no] = block
+            if len(self._blocks) > self.MAX_BLOCKS: self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(block_no)
+        return block[pos] if pos < len(block) else None
+
+    # --- Affichage ---
+    def _on_resize(self):
+        rowheight = int(ttk.Style(self).lookup("Treeview", "rowheight") or 20)
+        bbox = self.tree.bbox(self._items[0]) if self._items else None
+        header = bbox[1] if bbox else rowheight
+        visible = max(1, (self.tree.winfo_height() - header) // rowheight)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            self.offset = max(0, min(self.offset, self.total - visible))
+            self._render()
+
+    def _render(self):
+        rows = [self._row(i) for i in range(self.offset, min(self.offset + self.visible_rows, self.total))]
+        rows = [r for r in rows if r is not None]
+        while len(self._items) > len(rows): self.tree.delete(self._items.pop())
+        while len(self._items) < len(rows): self._items.append(self.tree.insert("", "end"))
+        selected_item = None
+        for pos, (item, row) in enumerate(zip(self._items, rows)):
+            self.tree.item(item, values=row[:self._width])
+            if row[0] == self.selected_id: selected_item, self.selected_index = item, self.offset + pos
+        if selected_item:
+            self.tree.selection_set(selected_item); self.tree.focus(selected_item)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, min(1.0, (self.offset + self.visible_rows) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # --- Défilement ---
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), self.total - self.visible_rows))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def see_index(self, index, render=True):
+        if index < self.offset: self.offset = index
+        elif index >= self.offset + self.visible_rows: self.offset = index - self.visible_rows + 1
+        if render: self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto": self.scroll_to(round(float(value) * self.total))
+        elif action == "scroll": self.scroll(int(value) * (self.visible_rows if unit == "pages" else 1))
+
+    # --- Sélection ---
+    def _on_tree_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection: return # Élément sélectionné sorti de la zone visible : la sélection est conservée
+        index = self.offset + self._items.index(selection[0])
+        values = self.tree.item(selection[0], "values")
+        row = self._row(index) if index < self.total else None # None : ligne disparue depuis le dernier count()
+        if row is None or str(row[0]) != str(values[0]): return
+        row_id = row[0]
+        if row_id != self.selected_id:
+            self.selected_id, self.selected_index = row_id, index
+            self.event_generate("<<SelectionChanged>>")
+
+    def _move_selection(self, step):
+        if not self.total: return
+        if self.selected_index is None and self.selected_id is not None and self._index_of:
+            self.selected_index = self._index_of(self.selected_id)
+        current = self.selected_index if self.selected_index is not None else self.offset - 1
+        if step == "page": index = current + self.visible_rows
+        elif step == "-page": index = current - self.visible_rows
+        elif step == "home": index = 0
+        elif step == "end": index = self.total - 1
+        else: index = current + step
+        index = max(0, min(index, self.total - 1))
+        row = self._row(index)
+        if row is None or (index == self.selected_index and row[0] == self.selected_id): return
+        self.selected_id, self.selected_index = row[0], index
+        self.see_index(index)
+        self.event_generate("<<SelectionChanged>>")
@@ -1,54 +1,266 @@
 # utils/date_utils.py
 from datetime import datetime, timedelta, date
+from bisect import bisect_left
+from functools import lru_cache
 from dateutil import parser
 import holidays
 import sqlite3
 import logging
+import threading
 from utils.config_loader import CONFIG
+try:
+    import numpy as np
+except ImportError: # NumPy est optionnel : les calculs par lot se replient sur BusinessCalendar
+    np = None
+
+def _parse_iso(date_str):
+    """Chemin rapide strict pour le format SQL YYYY-MM-DD (celui stocké en base)."""
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        try:
+            return datetime.fromisoformat(date_str)
+        except ValueError:
+            return None
+    return None
+
+def _parse_dayfirst_slash(date_str):
+    """Chemin rapide strict pour le format saisi JJ/MM/AAAA."""
+    if len(date_str) == 10 and date_str[2] == '/' and date_str[5] == '/':
+        try:
+            return datetime(int(date_str[6:]), int(date_str[3:5]), int(date_str[:2]))
+        except ValueError:
+            return None
+    return None
+
+@lru_cache(maxsize=2048)
+def _parse_date_cached(date_str, dayfirst):
+    """Repli sur dateutil pour les formats libres saisis par l'utilisateur, mémorisé (LRU borné)."""
+    try:
+        return parser.parse(date_str, dayfirst=dayfirst)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+def parse_date(date_str, dayfirst=True):
+    """Convertit une chaîne en datetime : formats stricts d'abord, dateutil seulement en dernier recours."""
+    if isinstance(date_str, datetime): return date_str
+    if isinstance(date_str, date): return datetime(date_str.year, date_str.month, date_str.day)
+    if not isinstance(date_str, str): return None
+    date_str = date_str.strip()
+    if not date_str: return None
+    parsed = _parse_iso(date_str)
+    if parsed is None and dayfirst:
+        parsed = _parse_dayfirst_slash(date_str)
+    return parsed if parsed is not None else _parse_date_cached(date_str, dayfirst)
+
+def to_sql_date(value):
+    """Convertit une date (objet ou chaîne) au format de stockage SQL YYYY-MM-DD."""
+    parsed = parse_date(value)
+    return parsed.strftime('%Y-%m-%d') if parsed else value
 
 def format_date_for_display(date_str_sql):
     """Convertit une date du format SQL (YYYY-MM-DD) en format affichable (DD/MM/YYYY)."""
     if not date_str_sql: return ""
-    try:
-        return parser.parse(date_str_sql).strftime("%d/%m/%Y")
-    except (ValueError, TypeError):
-        return date_str_sql
+    if hasattr(date_str_sql, 'strftime'):
+        return date_str_sql.strftime("%d/%m/%Y")
+    if _parse_iso(date_str_sql) is not None:
+        return f"{date_str_sql[8:10]}/{date_str_sql[5:7]}/{date_str_sql[:4]}"
+    parsed = _parse_date_cached(date_str_sql, False)
+    return parsed.strftime("%d/%m/%Y") if parsed else date_str_sql
 
 def validate_date(date_str, dayfirst=True):
     """Valide et convertit une chaîne de caractères en objet datetime."""
     if not date_str: return None
+    return parse_date(date_str, dayfirst)
+
+# Cache des jours fériés partagé par tout le processus.
+# Les jours officiels ne changent jamais ; les jours fusionnés (officiels + personnalisés)
+# sont invalidés par DatabaseManager à chaque modification de jours_feries_personnalises.
+# Les caches sont lus et modifiés depuis les threads de l'exécuteur : _cache_lock protège chaque accès (jamais
+# pendant une requête SQL) et _cache_generation, incrémenté à chaque invalidation, empêche de mémoriser un
+# résultat lu avant une modification.
+_official_holidays_cache = {}   # (pays, année) -> {date: nom}
+_holidays_cache = {}            # (pays, année) -> {date: nom}
+_periods_cache = {}             # (pays, année début, année fin) -> frozenset des dates
+_cache_lock = threading.Lock()
+_cache_generation = 0
+
+def _get_official_holidays(country_code, year):
+    key = (country_code, year)
+    with _cache_lock:
+        cached = _official_holidays_cache.get(key)
+    if cached is None:
+        cached = dict(holidays.country_holidays(country_code, years=year))
+        with _cache_lock:
+            cached = _official_holidays_cache.setdefault(key, cached)
+    return cached
+
+def get_holidays_for_year(db_manager, year):
+    """Retourne les jours fériés (officiels et personnalisés) d'une année, depuis le cache si possible."""
+    country_code = CONFIG['conges']['holidays_country']
+    if not (db_manager and db_manager.conn):
+        return _get_official_holidays(country_code, year)
+    key = (country_code, year)
+    with _cache_lock:
+        cached, generation = _holidays_cache.get(key), _cache_generation
+    if cached is not None:
+        return cached
+    year_h = dict(_get_official_holidays(country_code, year))
     try:
-        return parser.parse(date_str, dayfirst=dayfirst)
-    except (ValueError, TypeError):
-        return None
+        for date_str, name, type in db_manager.get_holidays_for_year(str(year)):
+            year_h[validate_date(date_str).date()] = name
+    except sqlite3.Error as e:
+        # On ne met pas en cache un résultat incomplet
+        logging.error(f"Erreur lors du chargement des jours fériés pour l'année {year}: {e}")
+        return year_h
+    with _cache_lock:
+        if generation == _cache_generation: _holidays_cache[key] = year_h
+    return year_h
+
+def invalidate_holidays_cache(year=None):
+    """Invalide le cache des jours fériés pour une année donnée (ou pour toutes les années)."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        if year is None:
+            _holidays_cache.clear()
+            _periods_cache.clear()
+            return
+        year = int(year)
+        for key in [k for k in _holidays_cache if k[1] == year]:
+            del _holidays_cache[key]
+        for key in [k for k in _periods_cache if k[1] <= year <= k[2]]:
+            del _periods_cache[key]
 
 def get_holidays_set_for_period(db_manager, start_year, end_year):
     """Charge les jours fériés (officiels et personnalisés) pour une période donnée."""
     country_code = CONFIG['conges']['holidays_country']
-    all_h = {}
-    for year in range(start_year, end_year + 2): # Prévoir une marge
-        all_h.update(holidays.country_holidays(country_code, years=year))
-        try:
-            if db_manager and db_manager.conn:
-                db_h = db_manager.get_holidays_for_year(str(year))
-                for date_str, name, type in db_h:
-                    all_h[validate_date(date_str).date()] = name
-        except sqlite3.Error as e:
-            logging.error(f"Erreur lors du chargement des jours fériés pour l'année {year}: {e}")
-    return set(all_h.keys())
+    last_year = end_year + 1 # Prévoir une marge
+    use_cache = bool(db_manager and db_manager.conn)
+    key = (country_code, start_year, last_year)
+    with _cache_lock:
+        cached, generation = _periods_cache.get(key), _cache_generation
+    if use_cache and cached is not None:
+        return cached
+    all_h = set()
+    for year in range(start_year, last_year + 1):
+        all_h.update(get_holidays_for_year(db_manager, year))
+    result = frozenset(all_h)
+    # Un échec SQL laisse l'année hors du cache : la période n'est mémorisée que si elle est complète
+    with _cache_lock:
+        if use_cache and generation == _cache_generation and all((country_code, y) in _holidays_cache for y in range(start_year, last_year + 1)):
+            _periods_cache[key] = result
+    return result
+
+class BusinessCalendar:
+    """
+    Calendrier des jours ouvrés construit une seule fois pour un ensemble de jours fériés.
+    Un tableau cumulatif (somme préfixe) des jours ouvrés permet de compter les jours
+    ouvrés entre deux dates en O(1) et de retrouver le N-ième jour ouvré par recherche binaire.
+    """
+    MARGE_ANNEES = 2
+
+    def __init__(self, holidays_set, start_year=None, end_year=None):
+        self.holidays = frozenset(holidays_set)
+        years = [d.year for d in self.holidays]
+        today_year = date.today().year
+        start_year = start_year or min(years + [today_year]) - 1
+        end_year = end_year or max(years + [today_year]) + self.MARGE_ANNEES
+        self._busdaycalendar = None
+        self._lock = threading.Lock()
+        # Plage précalculée (année de début, année de fin, origine, cumul) : un seul attribut, remplacé d'un bloc,
+        # pour qu'un thread qui lit pendant une extension ne voie jamais une origine et un cumul dépareillés
+        self._range = self._build(start_year, end_year)
+
+    @property
+    def start_year(self):
+        return self._range[0]
+
+    @property
+    def end_year(self):
+        return self._range[1]
+
+    def _build(self, start_year, end_year):
+        """Précalcule le cumul : cumul[i] = nombre de jours ouvrés dans [origine, origine + i[."""
+        origin = date(start_year, 1, 1).toordinal()
+        nb_days = date(end_year, 12, 31).toordinal() - origin + 1
+        cumul = [0] * (nb_days + 1)
+        total = 0
+        current_day = date(start_year, 1, 1)
+        for i in range(nb_days):
+            if current_day.weekday() < 5 and current_day not in self.holidays: # Lundi=0, Dimanche=6
+                total += 1
+            cumul[i + 1] = total
+            current_day += timedelta(days=1)
+        return start_year, end_year, origin, cumul
+
+    def _ensure_range(self, *days):
+        """Étend la plage précalculée si une date tombe en dehors ; renvoie la plage à utiliser (origine, cumul)."""
+        start_year, end_year, origin, cumul = self._range
+        if any(d.year < start_year or d.year + 1 > end_year for d in days):
+            with self._lock:
+                start_year, end_year = self._range[:2]
+                start_year = min([start_year] + [d.year - 1 for d in days])
+                end_year = max([end_year] + [d.year + self.MARGE_ANNEES for d in days])
+                if (start_year, end_year) != self._range[:2]:
+                    self._range = self._build(start_year, end_year)
+                start_year, end_year, origin, cumul = self._range
+        return origin, cumul
+
+    def is_working_day(self, day):
+        day = _as_date(day)
+        return day.weekday() < 5 and day not in self.holidays
+
+    def count(self, date_debut, date_fin):
+        """Nombre de jours ouvrés entre deux dates incluses, en O(1)."""
+        start_day, end_day = _as_date(date_debut), _as_date(date_fin)
+        if end_day < start_day:
+            return 0
+        origin, cumul = self._ensure_range(start_day, end_day)
+        return cumul[end_day.toordinal() - origin + 1] - cumul[start_day.toordinal() - origin]
+
+    def nth_working_day(self, start_date, n):
+        """Date du N-ième jour ouvré à partir de start_date (inclus), par recherche binaire."""
+        start_day = _as_date(start_date)
+        origin, cumul = self._ensure_range(start_day)
+        target = cumul[start_day.toordinal() - origin] + n
+        # On s'assure que la plage contient assez de jours ouvrés pour atteindre la cible
+        while target > cumul[-1]:
+            origin, cumul = self._ensure_range(date(self.end_year + 1, 1, 1))
+        return date.fromordinal(origin + bisect_left(cumul, target) - 1)
+
+    def next_working_day(self, day):
+        """Premier jour ouvré strictement postérieur à la date donnée."""
+        return self.nth_working_day(_as_date(day) + timedelta(days=1), 1)
+
+    @property
+    def busdaycalendar(self):
+        """Équivalent NumPy (semaine du lundi au vendredi + jours fériés), construit à la demande."""
+        if self._busdaycalendar is None:
+            self._busdaycalendar = np.busdaycalendar(weekmask="1111100", holidays=sorted(self.holidays))
+        return self._busdaycalendar
+
+
+_calendars_cache = {}
+
+def get_business_calendar(holidays_set):
+    """Retourne le calendrier ouvré associé à un ensemble de jours fériés (construit une seule fois)."""
+    key = holidays_set if isinstance(holidays_set, frozenset) else frozenset(holidays_set)
+    with _cache_lock:
+        calendar = _calendars_cache.get(key)
+    if calendar is None:
+        calendar = BusinessCalendar(key) # Construit hors verrou : au pire deux threads le construisent
+        with _cache_lock:
+            if key not in _calendars_cache and len(_calendars_cache) >= 16: _calendars_cache.clear()
+            calendar = _calendars_cache.setdefault(key, calendar)
+    return calendar
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
 
 def jours_ouvres(date_debut, date_fin, holidays_set):
     """Calcule le nombre de jours ouvrés entre deux dates, en excluant les jours fériés."""
     if not date_debut or not date_fin or date_fin < date_debut:
         return 0
-    jours = 0
-    current_day = date_debut.date() if isinstance(date_debut, datetime) else date_debut
-    end_day = date_fin.date() if isinstance(date_fin, datetime) else date_fin
-    while current_day <= end_day:
-        if current_day.weekday() < 5 and current_day not in holidays_set: # Lundi=0, Dimanche=6
-            jours += 1
-        current_day += timedelta(days=1)
-    return jours
+    return get_business_calendar(holidays_set).count(date_debut, date_fin)
 
 def calculate_reprise_date(end_date, holidays_set):
     """
@@ -58,15 +270,51 @@ def calculate_reprise_date(end_date, holidays_set):
     """
     if not end_date:
         return None
-        
-    # On s'assure de travailler avec un objet 'date' pour la comparaison
-    reprise_date = end_date.date() if isinstance(end_date, datetime) else end_date
-    # On commence par le lendemain de la date de fin
-    reprise_date += timedelta(days=1)
-    
-    # Tant que la date de reprise est un week-end OU un jour férié, on passe au jour suivant.
-    # weekday() -> Lundi=0, ..., Samedi=5, Dimanche=6
-    while reprise_date.weekday() >= 5 or reprise_date in holidays_set: 
-        reprise_date += timedelta(days=1)
-        
-    return reprise_date
\ No newline at end of file
+    return get_business_calendar(holidays_set).next_working_day(end_date)
+
+
+# --- Calculs par lot (audit, exports, recalculs annuels) ---
+
+def _to_datetime64(dates):
+    """Convertit une séquence de dates (None autorisé) en tableau datetime64[D] et masque de validité."""
+    days = [_as_date(d) for d in dates]
+    valid = np.array([d is not None for d in days], dtype=bool)
+    placeholder = date(2000, 1, 1)
+    values = np.array([d if d is not None else placeholder for d in days], dtype="datetime64[D]")
+    return values, valid
+
+def batch_jours_ouvres(dates_debut, dates_fin, holidays_set):
+    """Nombre de jours ouvrés pour chaque couple (début, fin), calculé en une seule passe vectorisée."""
+    if np is None:
+        return [jours_ouvres(d, f, holidays_set) for d, f in zip(dates_debut, dates_fin)]
+    if not len(dates_debut):
+        return []
+    debuts, valid_debuts = _to_datetime64(dates_debut)
+    fins, valid_fins = _to_datetime64(dates_fin)
+    # busday_count compte l'intervalle [début, fin[ : on décale la fin d'un jour pour l'inclure
+    counts = np.busday_count(debuts, fins + np.timedelta64(1, "D"), busdaycal=get_business_calendar(holidays_set).busdaycalendar)
+    counts[~(valid_debuts & valid_fins) | (fins < debuts)] = 0
+    return counts.tolist()
+
+def batch_end_dates(dates_debut, days_to_add, holidays_set):
+    """Date de fin (N-ième jour ouvré, début inclus) pour chaque couple (début, durée)."""
+    calendar = get_business_calendar(holidays_set)
+    if np is None:
+        return [calendar.nth_working_day(d, n) if d and n > 0 else d for d, n in zip(dates_debut, days_to_add)]
+    if not len(dates_debut):
+        return []
+    debuts, valid = _to_datetime64(dates_debut)
+    durees = np.asarray(days_to_add, dtype=np.int64)
+    fins = np.busday_offset(debuts, np.maximum(durees - 1, 0), roll="forward", busdaycal=calendar.busdaycalendar)
+    return [fin if ok and n > 0 else debut for fin, ok, n, debut in zip(fins.astype(object), valid, durees, dates_debut)]
+
+def batch_reprise_dates(dates_fin, holidays_set):
+    """Date de reprise (jour ouvré suivant la fin) pour chaque date de fin."""
+    calendar = get_business_calendar(holidays_set)
+    if np is None:
+        return [calendar.next_working_day(f) if f else None for f in dates_fin]
+    if not len(dates_fin):
+        return []
+    fins, valid = _to_datetime64(dates_fin)
+    reprises = np.busday_offset(fins + np.timedelta64(1, "D"), 0, roll="forward", busdaycal=calendar.busdaycalendar)
+    return [r if ok else None for r, ok in zip(reprises.astype(object), valid)]
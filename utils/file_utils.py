@@ -5,225 +5,458 @@ from tkinter import filedialog, messagebox
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font
+from openpyxl.cell import WriteOnlyCell
 from datetime import datetime
+import csv
+import functools
+import itertools
+import json
+import os
+import unicodedata
+from contextlib import contextmanager
 import sqlite3
 
 from utils.config_loader import CONFIG
-from utils.date_utils import format_date_for_display
+from utils.date_utils import format_date_for_display, get_holidays_set_for_period, batch_reprise_dates, parse_date
+from utils.task_executor import TaskCancelled
+from ui.widgets.secondary_windows import ImportReportWindow, ExportFiltersDialog
 
-def export_agents_to_excel(main_window, db_manager):
-    """Exporte la liste complète des agents vers un fichier Excel."""
-    main_window.config(cursor="watch")
-    main_window.update_idletasks()
-    main_window.set_status("Exportation des agents en cours...")
-    
-    try:
-        agents = db_manager.get_agents()
-        if not agents:
-            messagebox.showinfo("Information", "Aucun agent à exporter.")
-            return
-
-        filename = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Fichiers Excel", "*.xlsx")],
-            title="Exporter la liste des agents",
-            initialfile=f"Export_Agents_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
-        )
-        if not filename: return
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Agents"
-        
-        # Correction pour exporter correctement les données de l'objet Agent
-        headers = ["ID", "Nom", "Prénom", "PPR", "Grade", "Solde"]
-        ws.append(headers)
-        
-        header_font = Font(bold=True)
-        for cell in ws[1]:
-            cell.font = header_font
-
-        for agent in agents:
-            ws.append([agent.id, agent.nom, agent.prenom, agent.ppr, agent.grade, agent.solde])
-
-        for col_idx, col_cells in enumerate(ws.columns, 1):
-            max_length = max(len(str(cell.value or "")) for cell in col_cells)
-            ws.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
-        
+def _report_task_error(main_window, title):
+    """Callback d'erreur commun des tâches d'export/import (une annulation n'est pas une erreur)."""
+    def on_error(e):
+        if isinstance(e, TaskCancelled): main_window.set_status("Opération annulée.")
+        else: messagebox.showerror(title, f"Impossible de terminer l'opération : {e}", parent=main_window)
+    return on_error
+
+def _normalize_header(value):
+    """Nom de colonne normalisé (minuscules, sans accents) : « Prénom » et « prenom » désignent la même colonne."""
+    text = unicodedata.normalize('NFKD', str(value or '').strip().lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+AGENTS_EXPORT_HEADERS = ["ID", "Nom", "Prénom", "PPR", "Grade", "Solde"]
+# Clés des formats CSV/JSONL : elles doivent recouvrir agent_import_headers pour qu'un export soit réimportable tel quel
+AGENTS_EXPORT_KEYS = [_normalize_header(h) for h in AGENTS_EXPORT_HEADERS]
+_missing_keys = [h for h in CONFIG['agent_import_headers'] if h not in AGENTS_EXPORT_KEYS]
+if _missing_keys:
+    raise ValueError(f"agent_import_headers (config.yaml) : colonnes absentes de l'export des agents ({', '.join(_missing_keys)}). "
+                     f"Colonnes disponibles : {', '.join(AGENTS_EXPORT_KEYS)}")
+CONGES_EXPORT_HEADERS = ["Nom Agent", "Prénom Agent", "PPR Agent", "Type Congé", "Début", "Fin", "Date Reprise", "Jours Pris", "Statut", "Justification", "Intérimaire"]
+CONGES_EXPORT_KEYS = ["nom", "prenom", "ppr", "type_conge", "date_debut", "date_fin", "date_reprise", "jours_pris", "statut", "justif", "interim"]
+HOLIDAYS_EXPORT_HEADERS = ["Date", "Description", "Type"]
+HOLIDAYS_EXPORT_KEYS = ["date", "nom", "type"]
+CERTIFICATS_EXPORT_HEADERS = ["ID Congé", "PPR Agent", "Nom Agent", "Prénom Agent", "Début", "Fin", "Médecin", "Durée (jours)", "Fichier", "SHA-256"]
+CERTIFICATS_EXPORT_KEYS = ["conge_id", "ppr", "nom", "prenom", "date_debut", "date_fin", "nom_medecin", "duree_jours", "chemin_fichier", "sha256"]
+WIDTH_SAMPLE_ROWS = 200 # Largeur des colonnes estimée sur les premières lignes seulement
+EXPORT_FILETYPES = [("Fichiers Excel", "*.xlsx"), ("Fichiers CSV", "*.csv"), ("Fichiers JSON Lines", "*.jsonl")]
+
+def _estimate_widths(headers, sample_rows):
+    widths = [len(h) for h in headers]
+    for row in sample_rows:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(str(value if value is not None else "")))
+    return [min(w, 60) + 2 for w in widths]
+
+def _stream_chunks(write_chunk, chunks, ctx, total):
+    """Boucle commune des écritures en flux : annulation et progression à chaque bloc. Retourne le nombre de lignes."""
+    written = 0
+    for chunk in chunks:
+        ctx.check_cancelled()
+        write_chunk(chunk)
+        written += len(chunk)
+        ctx.progress(written, total)
+    return written
+
+def _write_streamed_sheet(wb, title, headers, chunks, ctx, total):
+    """
+    Écrit une feuille en mode write_only à partir de blocs de lignes déjà formatées.
+    Le premier bloc sert d'échantillon pour les largeurs, qui doivent être fixées avant la première ligne.
+    """
+    ws = wb.create_sheet(title)
+    first = next(chunks, [])
+    for col_idx, width in enumerate(_estimate_widths(headers, first[:WIDTH_SAMPLE_ROWS]), 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+    header_font = Font(bold=True)
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h); cell.font = header_font; header_cells.append(cell)
+    ws.append(header_cells)
+    def write_chunk(chunk):
+        for row in chunk: ws.append(row)
+    return _stream_chunks(write_chunk, itertools.chain([first], chunks), ctx, total)
+
+def _write_csv(filename, keys, chunks, ctx, total):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(keys)
+        return _stream_chunks(writer.writerows, chunks, ctx, total)
+
+def _write_jsonl(filename, keys, chunks, ctx, total):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    with open(filename, 'w', encoding='utf-8') as f:
+        def write_chunk(chunk):
+            f.writelines(encode(dict(zip(keys, row))) + "\n" for row in chunk)
+        return _stream_chunks(write_chunk, chunks, ctx, total)
+
+def _format_conges_chunk(db_manager, rows, iso=False):
+    """Lignes de iter_conges_export -> lignes d'export (reprise calculée en lot ; dates ISO pour CSV/JSONL, sinon affichables)."""
+    fins = [parse_date(r[5]) for r in rows]
+    years = [f.year for f in fins if f]
+    holidays_set = get_holidays_set_for_period(db_manager, min(years), max(years)) if years else frozenset()
+    reprises = batch_reprise_dates(fins, holidays_set)
+    fmt = (lambda d: d) if iso else format_date_for_display
+    out = []
+    for r, reprise in zip(rows, reprises):
+        agent_nom, agent_prenom, agent_ppr = (r[0], r[1], r[2]) if r[0] is not None else ("Agent", "Supprimé", "")
+        interim_info = ""
+        if r[9]:
+            interim_info = f"{r[10]} {r[11]}" if r[10] is not None else "Agent Supprimé"
+        reprise_str = (reprise.isoformat() if iso else reprise.strftime("%d/%m/%Y")) if reprise else ""
+        out.append([agent_nom, agent_prenom, agent_ppr, r[3], fmt(r[4]), fmt(r[5]), reprise_str, r[6], r[7], r[8] or "", interim_info])
+    return out
+
+def _format_dates_chunk(rows, date_indexes, iso):
+    if iso: return rows
+    return [[format_date_for_display(v) if i in date_indexes else v for i, v in enumerate(r)] for r in rows]
+
+# Jeux de données exportables : (titre de feuille, en-têtes Excel, clés CSV/JSONL, source(db, iso, **filtres) -> blocs de lignes)
+EXPORT_DATASETS = {
+    'agents': ("Agents", AGENTS_EXPORT_HEADERS, AGENTS_EXPORT_KEYS, lambda db, iso: db.iter_agents_export()),
+    'conges': ("Congés", CONGES_EXPORT_HEADERS, CONGES_EXPORT_KEYS,
+               lambda db, iso, **filters: (_format_conges_chunk(db, rows, iso) for rows in db.iter_conges_export(**filters))),
+    'jours_feries': ("Jours fériés", HOLIDAYS_EXPORT_HEADERS, HOLIDAYS_EXPORT_KEYS,
+                     lambda db, iso: (_format_dates_chunk(rows, {0}, iso) for rows in db.iter_holidays_export())),
+    'certificats': ("Certificats", CERTIFICATS_EXPORT_HEADERS, CERTIFICATS_EXPORT_KEYS,
+                    lambda db, iso: (_format_dates_chunk(rows, {4, 5}, iso) for rows in db.iter_certificats_export())),
+}
+
+def write_dataset(db_manager, dataset, filename, ctx, filters=None, total=None):
+    """
+    Écrit un jeu de données dans le format donné par l'extension du fichier (.xlsx, .csv ou .jsonl), en flux.
+    CSV et JSONL sont écrits directement par blocs (writerows), sans passer par openpyxl. Retourne le nombre de lignes.
+    """
+    title, headers, keys, source = EXPORT_DATASETS[dataset]
+    ext = os.path.splitext(filename)[1].lower()
+    chunks = source(db_manager, ext != '.xlsx', **(filters or {}))
+    if ext == '.xlsx':
+        wb = openpyxl.Workbook(write_only=True)
+        count = _write_streamed_sheet(wb, title, headers, chunks, ctx, total)
+        ctx.check_cancelled()
         wb.save(filename)
-        messagebox.showinfo("Succès", f"Liste des agents exportée avec succès vers\n{filename}")
-    except Exception as e:
-        messagebox.showerror("Erreur d'écriture", f"Impossible de sauvegarder le fichier : {e}")
-    finally:
-        main_window.config(cursor="")
-        main_window.set_status("Prêt.")
+        return count
+    writer = {'.csv': _write_csv, '.jsonl': _write_jsonl}.get(ext)
+    if writer is None: raise ValueError(f"Format de fichier non pris en charge : {ext or filename}")
+    try:
+        return writer(filename, keys, chunks, ctx, total)
+    except BaseException:
+        if os.path.exists(filename): os.remove(filename) # Pas de fichier tronqué après une annulation ou une erreur
+        raise
+
+def export_dataset(parent, executor, db_manager, dataset, title, initialfile, filters=None, total=None):
+    """Demande le fichier de destination (Excel, CSV ou JSONL) puis lance l'export en arrière-plan."""
+    filename = filedialog.asksaveasfilename(parent=parent, defaultextension=".xlsx", filetypes=EXPORT_FILETYPES, title=title, initialfile=initialfile)
+    if not filename: return
+    executor.submit(
+        title, lambda ctx: write_dataset(db_manager, dataset, filename, ctx, filters, total),
+        on_success=lambda count: messagebox.showinfo("Succès", f"{count} ligne(s) exportée(s) avec succès vers\n{filename}", parent=parent),
+        on_error=_report_task_error(parent, "Erreur d'écriture"))
+
+def export_agents_to_excel(main_window, db_manager):
+    """Exporte la liste complète des agents (Excel, CSV ou JSONL, écriture en arrière-plan)."""
+    total = db_manager.get_agents_count()
+    if not total:
+        messagebox.showinfo("Information", "Aucun agent à exporter."); return
+    export_dataset(main_window, main_window.executor, db_manager, 'agents', "Exporter la liste des agents",
+                   f"Export_Agents_{datetime.now().strftime('%Y-%m-%d')}.xlsx", total=total)
 
 def export_all_conges_to_excel(main_window, db_manager):
-    """Exporte la liste complète de tous les congés vers un fichier Excel."""
-    main_window.config(cursor="watch")
-    main_window.update_idletasks()
-    main_window.set_status("Exportation totale en cours...")
-    
+    """Exporte les congés (filtrés par année, type et grade) en Excel, CSV ou JSONL, en flux et en arrière-plan."""
+    filters = ExportFiltersDialog.ask(main_window, db_manager.get_conges_years(), CONFIG['ui']['types_conge'], CONFIG['ui']['grades'])
+    if filters is None: return
+    total = db_manager.count_conges_export(**filters)
+    if not total:
+        messagebox.showinfo("Information", "Aucun congé à exporter."); return
+    suffix = "_".join(str(v) for v in filters.values() if v).replace(" ", "-")
+    export_dataset(main_window, main_window.executor, db_manager, 'conges', "Exporter les congés",
+                   f"Export_Conges_{suffix or 'Total'}_{datetime.now().strftime('%Y-%m-%d')}.xlsx", filters, total)
+
+def export_timeline_to_excel(parent, executor, timeline, headers):
+    """Exporte la chronologie des absences (une ligne par jour) vers un fichier Excel."""
+    filename = filedialog.asksaveasfilename(
+        parent=parent,
+        defaultextension=".xlsx",
+        filetypes=[("Fichiers Excel", "*.xlsx")],
+        title="Exporter le calendrier des absences",
+        initialfile=f"Absences_{timeline.start.strftime('%Y-%m-%d')}.xlsx"
+    )
+    if not filename: return
+    executor.submit(
+        "Export du calendrier des absences", lambda ctx: _write_timeline_workbook(timeline, headers, filename),
+        on_success=lambda _: messagebox.showinfo("Succès", f"Calendrier des absences exporté avec succès vers\n{filename}", parent=parent),
+        on_error=lambda e: messagebox.showerror("Erreur d'écriture", f"Impossible de sauvegarder le fichier : {e}", parent=parent))
+
+def _write_timeline_workbook(timeline, headers, filename):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Absences")
+    for col_idx, header in enumerate(headers, 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = max(len(header), 10) + 2
+    ws.append(headers)
+    for row in timeline.rows():
+        ws.append([row[0].strftime("%d/%m/%Y"), *row[1:]])
+    ws_peaks = wb.create_sheet("Jours de pointe")
+    ws_peaks.append(["Date", "Absents"])
+    for day, absents in timeline.peak_days(20):
+        ws_peaks.append([day.strftime("%d/%m/%Y"), absents])
+    wb.save(filename)
+
+def _parse_agent_row(row, col_map, grades, default_grade, default_solde, line_number):
+    """Valide et normalise une ligne du fichier d'import. Retourne (nom, prénom, ppr, grade, solde) ou lève ValueError."""
+    # 1. Lecture des champs obligatoires
+    nom = str(row[col_map['nom']] or '').strip()
+    prenom = str(row[col_map['prenom']] or '').strip()
+    if not nom or not prenom:
+        raise ValueError("Le nom et le prénom sont obligatoires.")
+
+    # 2. Lecture des champs optionnels avec valeurs par défaut
+    ppr = str(row[col_map['ppr']] or '').strip()
+    grade = str(row[col_map['grade']] or '').strip()
+    solde_str = str(row[col_map['solde']] or '').strip().replace(",", ".")
+
+    # Générer un PPR unique si manquant (le numéro de ligne évite les collisions dans un même import)
+    if not ppr:
+        timestamp = datetime.now().strftime('%H%M%S%f')
+        ppr = f"{nom.upper()[:4]}_{prenom.upper()[:4]}_{timestamp}_{line_number}"
+
+    # Appliquer le grade par défaut si manquant, sinon le valider
+    if not grade:
+        grade = default_grade
+    elif grade not in grades:
+        raise ValueError(f"Grade '{grade}' invalide. Grades valides: {', '.join(grades)}")
+
+    # Appliquer le solde par défaut si manquant, sinon le valider
+    if not solde_str:
+        solde = default_solde
+    else:
+        try:
+            solde = float(solde_str)
+        except ValueError:
+            raise ValueError(f"Le solde '{solde_str}' n'est pas un nombre.")
+        if solde < 0:
+            raise ValueError(f"Le solde '{solde}' ne peut être négatif.")
+    return nom, prenom, ppr, grade, solde
+
+# --- Lecture en flux des fichiers d'import (Excel, CSV, JSONL) ---
+IMPORT_CHUNK_SIZE = 2000
+IMPORT_FILETYPES = [("Fichiers pris en charge", "*.xlsx *.csv *.jsonl")] + EXPORT_FILETYPES
+
+def _pad(row, width):
+    return tuple(row) + (None,) * (width - len(row))
+
+@contextmanager
+def _open_excel_rows(filename):
+    wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
     try:
-        all_conges = db_manager.get_conges()
-        if not all_conges:
-            messagebox.showinfo("Information", "Aucun congé à exporter.")
-            return
-
-        filename = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Fichiers Excel", "*.xlsx")],
-            title="Exporter tous les congés",
-            initialfile=f"Export_Conges_Total_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
-        )
-        if not filename: return
-
-        wb = openpyxl.Workbook()
         ws = wb.active
-        ws.title = "Tous les Congés"
-        headers = ["Nom Agent", "Prénom Agent", "PPR Agent", "Type Congé", "Début", "Fin", "Jours Pris", "Statut", "Justification", "Intérimaire"]
-        ws.append(headers)
-        header_font = Font(bold=True)
-        for cell in ws[1]:
-            cell.font = header_font
-
-        all_agents = {agent.id: agent for agent in db_manager.get_agents()}
-
-        for conge in all_conges:
-            agent = all_agents.get(conge.agent_id)
-            if not agent:
-                agent_nom, agent_prenom, agent_ppr = "Agent", "Supprimé", ""
-            else:
-                agent_nom, agent_prenom, agent_ppr = agent.nom, agent.prenom, agent.ppr
-
-            interim_info = ""
-            if conge.interim_id:
-                interim = all_agents.get(conge.interim_id)
-                interim_info = f"{interim.nom} {interim.prenom}" if interim else "Agent Supprimé"
-            
-            row_data = [
-                agent_nom, agent_prenom, agent_ppr,
-                conge.type_conge, 
-                format_date_for_display(conge.date_debut), 
-                format_date_for_display(conge.date_fin), 
-                conge.jours_pris,
-                conge.statut,
-                conge.justif or "", 
-                interim_info
-            ]
-            ws.append(row_data)
-
-        for col_idx, col_cells in enumerate(ws.columns, 1):
-            max_length = max(len(str(cell.value or "")) for cell in col_cells)
-            ws.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
-            
-        wb.save(filename)
-        messagebox.showinfo("Succès", f"Tous les congés ont été exportés avec succès vers\n{filename}")
-    except Exception as e:
-        messagebox.showerror("Erreur d'écriture", f"Impossible de sauvegarder le fichier : {e}")
+        rows = ws.iter_rows(values_only=True)
+        header = [_normalize_header(c) for c in next(rows, ())]
+        # En lecture seule les cellules vides de fin de ligne sont omises : on complète pour garder les index
+        yield header, ((i, _pad(row, len(header))) for i, row in enumerate(rows, start=2)), (ws.max_row or 1) - 1
     finally:
-        main_window.config(cursor="")
-        main_window.set_status("Prêt.")
+        wb.close()
 
-def import_agents_from_excel(main_window, db_manager):
-    """Importe des agents depuis un fichier Excel, en ajoutant les nouveaux et mettant à jour les existants."""
-    filename = filedialog.askopenfilename(
-        title="Sélectionner un fichier Excel à importer",
-        filetypes=[("Fichiers Excel", "*.xlsx")]
-    )
-    if not filename:
-        return
+@contextmanager
+def _open_csv_rows(filename):
+    with open(filename, newline='', encoding='utf-8-sig') as f: # utf-8-sig : accepte le BOM des CSV enregistrés par Excel
+        try: dialect = csv.Sniffer().sniff(f.readline(), delimiters=",;\t")
+        except csv.Error: dialect = csv.excel
+        f.seek(0)
+        reader = csv.reader(f, dialect)
+        header = [_normalize_header(c) for c in next(reader, [])]
+        yield header, ((reader.line_num, _pad(row, len(header))) for row in reader), None
+
+@contextmanager
+def _open_jsonl_rows(filename):
+    with open(filename, encoding='utf-8-sig') as f:
+        records = ((i, json.loads(line)) for i, line in enumerate(f, start=1) if line.strip())
+        first = next(records, None)
+        keys = list(first[1]) if first else [] # Les colonnes sont celles du premier enregistrement
+        rows = ((i, tuple(record.get(k) for k in keys)) for i, record in itertools.chain([first], records)) if first else iter(())
+        yield [_normalize_header(k) for k in keys], rows, None
+
+def open_rows(filename):
+    """
+    Ouvre un fichier d'import selon son extension (gestionnaire de contexte) :
+    (en-tête normalisé, itérateur (n° ligne, valeurs alignées sur l'en-tête), nb de lignes estimé ou None).
+    """
+    opener = {'.xlsx': _open_excel_rows, '.csv': _open_csv_rows, '.jsonl': _open_jsonl_rows}.get(os.path.splitext(filename)[1].lower())
+    if opener is None: raise ValueError(f"Format de fichier non pris en charge : {os.path.basename(filename)}")
+    return opener(filename)
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk: return
+        yield chunk
+
+def iter_records(filename, dataset, ctx=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Relit en flux un fichier (Excel, CSV ou JSONL) d'un jeu de EXPORT_DATASETS : blocs de (n° ligne, {clé: valeur}).
+    Une colonne est reconnue par sa clé CSV/JSONL ou par son en-tête Excel ; les colonnes inconnues sont ignorées.
+    """
+    _, headers, keys, _ = EXPORT_DATASETS[dataset]
+    aliases = {**{_normalize_header(h): k for h, k in zip(headers, keys)}, **{k: k for k in keys}}
+    with open_rows(filename) as (header, rows, total):
+        columns = [(i, aliases[name]) for i, name in enumerate(header) if name in aliases]
+        done = 0
+        for chunk in _chunked(rows, chunk_size):
+            if ctx: ctx.check_cancelled(); done += len(chunk); ctx.progress(done, total)
+            yield [(line_number, {k: values[i] for i, k in columns}) for line_number, values in chunk]
 
-    main_window.config(cursor="watch")
-    main_window.update_idletasks()
-    main_window.set_status("Importation en cours...")
-    
-    errors = []
-    agent_import_headers = CONFIG['agent_import_headers']
+# --- Import des agents : validation par blocs -> écriture groupée ---
+def _validate_agent_chunk(chunk, col_map, grades, default_grade, default_solde):
+    """Étape de validation (fonction pure, exécutable dans un pool) : retourne ([(ligne, valeurs, agent)], [(ligne, valeurs, message)])."""
+    valid, errors = [], []
+    for line_number, row in chunk:
+        if all(c is None or c == '' for c in row): continue
+        try:
+            valid.append((line_number, row, _parse_agent_row(row, col_map, grades, default_grade, default_solde, line_number)))
+        except (ValueError, TypeError, IndexError) as ve:
+            errors.append((line_number, row, str(ve)))
+        except Exception as e:
+            errors.append((line_number, row, f"Erreur - {e}"))
+    return valid, errors
+
+def _run_agent_import(db_manager, filename, ctx, dry_run=False, map_fn=map):
+    """
+    Pipeline d'import. Retourne (en-tête, erreurs [(ligne, valeurs, message)], ajoutés, mis à jour).
+    Rien n'est écrit s'il y a la moindre erreur ou en mode essai (dry_run).
+    map_fn permet de répartir la validation sur un pool (ex. ProcessPoolExecutor.map) ; par défaut elle
+    reste dans le thread de la tâche, la lecture du XML étant de loin l'étape la plus coûteuse.
+    """
     grades = CONFIG['ui']['grades']
-    
-    # Définition des valeurs par défaut
     default_grade = grades[0] if grades else "Administrateur"
     default_solde = 22.0
 
-    try:
-        wb = openpyxl.load_workbook(filename)
-        ws = wb.active
-        header = [str(cell.value or '').lower().strip() for cell in ws[1]]
-        
-        if not all(h in header for h in agent_import_headers):
-            raise ValueError(f"Colonnes requises dans le fichier Excel : {', '.join(agent_import_headers)}")
-
+    with open_rows(filename) as (header, rows, total):
+        if not all(h in header for h in CONFIG['agent_import_headers']):
+            raise ValueError(f"Colonnes requises dans le fichier Excel : {', '.join(CONFIG['agent_import_headers'])}")
         col_map = {name: i for i, name in enumerate(header)}
-        added_count, updated_count, error_count = 0, 0, 0
-        
-        db_manager.conn.execute('BEGIN TRANSACTION')
-        for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-            try:
-                if all(c is None for c in row): continue
-
-                # 1. Lecture des champs obligatoires
-                nom = str(row[col_map['nom']] or '').strip()
-                prenom = str(row[col_map['prenom']] or '').strip()
-                if not nom or not prenom:
-                    raise ValueError("Le nom et le prénom sont obligatoires.")
-
-                # 2. Lecture des champs optionnels avec valeurs par défaut
-                ppr = str(row[col_map['ppr']] or '').strip()
-                grade = str(row[col_map['grade']] or '').strip()
-                solde_str = str(row[col_map['solde']] or '').strip().replace(",", ".")
-
-                # Générer un PPR unique si manquant
-                if not ppr:
-                    timestamp = datetime.now().strftime('%H%M%S%f')
-                    ppr = f"{nom.upper()[:4]}_{prenom.upper()[:4]}_{timestamp}"
-                
-                # Appliquer le grade par défaut si manquant, sinon le valider
-                if not grade:
-                    grade = default_grade
-                elif grade not in grades:
-                    raise ValueError(f"Grade '{grade}' invalide. Grades valides: {', '.join(grades)}")
-                
-                # Appliquer le solde par défaut si manquant, sinon le valider
-                if not solde_str:
-                    solde = default_solde
-                else:
-                    solde = float(solde_str)
-                    if solde < 0:
-                        raise ValueError(f"Le solde '{solde}' ne peut être négatif.")
-
-                # Recherche et ajout/modification
-                agent = db_manager.get_agent_by_ppr(ppr)
-                if agent:
-                    if not db_manager.modifier_agent(agent.id, nom, prenom, ppr, grade, solde):
-                        raise Exception(f"Erreur de mise à jour pour PPR {ppr}.")
-                    updated_count += 1
-                else:
-                    if not db_manager.ajouter_agent(nom, prenom, ppr, grade, solde):
-                        raise Exception(f"Le PPR '{ppr}' existe déjà ou une autre erreur est survenue.")
-                    added_count += 1
-
-            except (ValueError, TypeError, IndexError) as ve:
-                errors.append(f"Ligne {i}: {ve}"); error_count += 1
-            except Exception as e:
-                errors.append(f"Ligne {i}: Erreur - {e}"); error_count += 1
-        
-        if error_count > 0:
-            db_manager.conn.rollback()
-            summary = "Échec de l'importation: Des erreurs ont été détectées.\nL'importation est annulée.\n\nAucune modification n'a été enregistrée."
+
+        def chunks():
+            done = 0
+            for chunk in _chunked(rows, IMPORT_CHUNK_SIZE):
+                ctx.check_cancelled()
+                done += len(chunk)
+                ctx.progress(min(done, total) if total else done, total, "validation")
+                yield chunk
+
+        validate = functools.partial(_validate_agent_chunk, col_map=col_map, grades=grades, default_grade=default_grade, default_solde=default_solde)
+        agents_rows, errors, seen_pprs = [], [], {}
+        for valid, chunk_errors in map_fn(validate, chunks()):
+            errors.extend(chunk_errors)
+            for line_number, row, agent_row in valid:
+                if agent_row[2] in seen_pprs:
+                    errors.append((line_number, row, f"PPR '{agent_row[2]}' en double (déjà présent ligne {seen_pprs[agent_row[2]]})."))
+                    continue
+                seen_pprs[agent_row[2]] = line_number
+                agents_rows.append(agent_row)
+
+    errors.sort(key=lambda e: e[0])
+    if errors or dry_run:
+        return header, errors, 0, 0
+    ctx.check_cancelled()
+    added_count, updated_count = db_manager.upsert_agents(agents_rows, progress=lambda done: ctx.progress(done, len(agents_rows), "enregistrement"))
+    return header, errors, added_count, updated_count
+
+def _write_error_workbook(filename, header, errors):
+    """Classeur d'erreurs du mode essai : ligne d'origine, valeurs lues et message."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Erreurs")
+    headers = ["Ligne"] + list(header) + ["Erreur"]
+    for col_idx, width in enumerate(_estimate_widths(headers, [[e[0], *(e[1] or ()), e[2]] for e in errors[:WIDTH_SAMPLE_ROWS]]), 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+    ws.append(headers)
+    for line_number, row, message in errors:
+        ws.append([line_number, *(row or [None] * len(header)), message])
+    wb.save(filename)
+
+def _error_messages(errors):
+    return [f"Ligne {line_number}: {message}" for line_number, _, message in errors]
+
+def import_agents_from_excel(main_window, db_manager, dry_run=False):
+    """
+    Importe des agents depuis un fichier Excel, CSV ou JSONL, en ajoutant les nouveaux et mettant à jour les existants.
+    Toutes les lignes sont validées avant la moindre écriture ; l'import est ensuite fait en un seul lot.
+    En mode essai (dry_run), rien n'est écrit : les erreurs sont enregistrées dans un classeur à côté du fichier.
+    """
+    filename = filedialog.askopenfilename(
+        title="Sélectionner un fichier d'agents à vérifier" if dry_run else "Sélectionner un fichier d'agents à importer",
+        filetypes=IMPORT_FILETYPES
+    )
+    if not filename:
+        return
+    errors_filename = os.path.splitext(filename)[0] + "_erreurs.xlsx"
+
+    def task(ctx):
+        header, errors, added, updated = _run_agent_import(db_manager, filename, ctx, dry_run)
+        if dry_run and errors: _write_error_workbook(errors_filename, header, errors)
+        return errors, added, updated
+
+    def on_success(result):
+        errors, added_count, updated_count = result
+        if dry_run:
             if errors:
-                summary += "\n\nDétail des erreurs (premières 5):\n" + "\n".join(errors[:5])
-            messagebox.showerror("Rapport d'importation", summary)
+                summary = f"Vérification terminée : {len(errors)} erreur(s) détectée(s).\n\nLe détail a été enregistré dans :\n{errors_filename}"
+                ImportReportWindow(main_window, summary, _error_messages(errors))
+            else:
+                messagebox.showinfo("Vérification", "Aucune erreur détectée : le fichier peut être importé.", parent=main_window)
+        elif errors:
+            summary = f"Échec de l'importation: {len(errors)} erreur(s) détectée(s).\nL'importation est annulée.\n\nAucune modification n'a été enregistrée."
+            ImportReportWindow(main_window, summary, _error_messages(errors))
         else:
-            db_manager.conn.commit()
             summary = f"Importation réussie !\n\n- Agents ajoutés : {added_count}\n- Agents mis à jour : {updated_count}"
-            messagebox.showinfo("Rapport d'importation", summary)
+            messagebox.showinfo("Rapport d'importation", summary, parent=main_window)
+            main_window.refresh_all()
 
-    except Exception as e:
-        db_manager.conn.rollback()
+    def on_error(e):
+        if isinstance(e, TaskCancelled): main_window.set_status("Importation annulée."); return
         summary = f"Échec de l'importation: {e}\n\nAucune modification n'a été enregistrée."
-        messagebox.showerror("Rapport d'importation", summary)
-    finally:
-        main_window.config(cursor="")
-        main_window.set_status("Prêt.")
-        main_window.refresh_all()
\ No newline at end of file
+        messagebox.showerror("Rapport d'importation", summary, parent=main_window)
+
+    main_window.executor.submit("Vérification du fichier" if dry_run else "Import des agents", task, on_success=on_success, on_error=on_error)
+
+# --- Jours fériés : import depuis un fichier (les exports passent par export_dataset) ---
+def _read_holidays(filename, ctx):
+    """
+    Retourne (lignes (date SQL, nom, type), erreurs). Colonnes attendues : date, nom, type (facultatif), ou les
+    en-têtes de l'export Excel (Date, Description, Type).
+    """
+    rows, errors = [], []
+    for chunk in iter_records(filename, 'jours_feries', ctx):
+        if chunk and not {'date', 'nom'} <= chunk[0][1].keys():
+            raise ValueError("Colonnes requises dans le fichier : date, nom")
+        for line_number, record in chunk:
+            if all(v is None or v == '' for v in record.values()): continue
+            day, nom = parse_date(record['date']), str(record['nom'] or '').strip()
+            h_type = str(record.get('type') or '').strip()
+            if not day or not nom: errors.append(f"Ligne {line_number}: date ou description invalide."); continue
+            rows.append((day.strftime("%Y-%m-%d"), nom, h_type or "Personnalisé"))
+    return rows, errors
+
+def import_holidays_from_file(parent, executor, db_manager, on_done=None):
+    """Importe (ajoute ou remplace par date) des jours fériés depuis un fichier Excel, CSV ou JSONL."""
+    filename = filedialog.askopenfilename(parent=parent, title="Sélectionner un fichier de jours fériés", filetypes=IMPORT_FILETYPES)
+    if not filename: return
+
+    def task(ctx):
+        rows, errors = _read_holidays(filename, ctx)
+        return (0, errors) if errors else (db_manager.upsert_holidays(rows), errors)
+
+    def on_success(result):
+        count, errors = result
+        if errors:
+            ImportReportWindow(parent, f"Échec de l'importation: {len(errors)} erreur(s) détectée(s).\n\nAucune modification n'a été enregistrée.", errors); return
+        messagebox.showinfo("Rapport d'importation", f"{count} jour(s) férié(s) importé(s).", parent=parent)
+        if on_done: on_done()
+
+    executor.submit("Import des jours fériés", task, on_success=on_success, on_error=_report_task_error(parent, "Rapport d'importation"))
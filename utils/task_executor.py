@@ -0,0 +1,125 @@
+# utils/task_executor.py
+"""
+Exécution des traitements longs (exports, import, audit, copies, statistiques) hors du thread Tk.
+Les tâches tournent dans un pool de threads ; chaque thread lit la base sur sa propre connexion
+(DatabaseManager.reader()). Progression et résultats sont remontés au thread de l'interface
+par une file lue périodiquement avec after() : les callbacks s'exécutent donc toujours côté Tk.
+"""
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskCancelled(Exception):
+    """Levée dans une tâche lorsque l'utilisateur a demandé son annulation."""
+
+
+class TaskContext:
+    """Passé à la fonction de la tâche : remontée de progression et test d'annulation."""
+    def __init__(self, task, events):
+        self._task, self._events = task, events
+
+    def progress(self, done, total=None, message=None):
+        self._events.put(('progress', self._task, (done, total, message)))
+
+    def cancelled(self):
+        return self._task.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled(): raise TaskCancelled(f"Tâche « {self._task.name} » annulée.")
+
+
+class DirectContext:
+    """Contexte minimal pour appeler une fonction de tâche directement, hors de l'interface (ligne de commande)."""
+    def progress(self, done, total=None, message=None): pass
+    def cancelled(self): return False
+    def check_cancelled(self): pass
+
+
+class Task:
+    def __init__(self, task_id, name, on_success, on_error, on_progress, silent=False):
+        self.id, self.name, self.silent = task_id, name, silent
+        self.on_success, self.on_error, self.on_progress = on_success, on_error, on_progress
+        self.cancel_event = threading.Event()
+        self.done, self.total, self.message = 0, None, None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class TaskExecutor:
+    POLL_MS = 50
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tache")
+        self._events = queue.Queue()
+        self._ids = itertools.count(1)
+        self.tasks = {} # tâches en cours, par identifiant
+        self._listeners = []
+        self._polling = False
+
+    def add_listener(self, callback):
+        """callback(executor) est appelé côté Tk à chaque changement (nouvelle tâche, progression, fin)."""
+        self._listeners.append(callback)
+
+    def submit(self, name, fn, on_success=None, on_error=None, on_progress=None, silent=False):
+        """
+        Lance fn(ctx) en arrière-plan. on_success(résultat), on_error(exception, y compris TaskCancelled) et
+        on_progress(fait, total, message) sont appelés dans le thread Tk. Une tâche silencieuse (silent=True)
+        n'apparaît pas dans la zone de progression. Retourne la Task (annulable).
+        """
+        task = Task(next(self._ids), name, on_success, on_error, on_progress, silent)
+        self.tasks[task.id] = task
+        self._pool.submit(self._run, task, fn)
+        self._notify()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+        return task
+
+    def _run(self, task, fn):
+        try:
+            result = fn(TaskContext(task, self._events))
+            self._events.put(('done', task, result))
+        except BaseException as e:
+            self._events.put(('error', task, e))
+
+    def _poll(self):
+        changed = False
+        while True:
+            try: kind, task, payload = self._events.get_nowait()
+            except queue.Empty: break
+            changed = True
+            try:
+                if kind == 'progress':
+                    task.done, task.total, message = payload
+                    if message: task.message = message
+                    if task.on_progress: task.on_progress(*payload)
+                    continue
+                self.tasks.pop(task.id, None)
+                if kind == 'done':
+                    if task.on_success: task.on_success(payload)
+                elif task.on_error: task.on_error(payload)
+                elif isinstance(payload, TaskCancelled): logging.info(str(payload))
+                else: logging.error(f"Échec de la tâche « {task.name} » : {payload}", exc_info=payload)
+            except Exception as e:
+                logging.error(f"Erreur dans le retour de la tâche « {task.name} » : {e}", exc_info=True)
+        if changed: self._notify()
+        if self.tasks or not self._events.empty():
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _notify(self):
+        for callback in self._listeners: callback(self)
+
+    def cancel_all(self):
+        for task in list(self.tasks.values()): task.cancel()
+
+    def shutdown(self, wait=False):
+        """Annule les tâches ; wait=True attend la fin de celles déjà lancées (avant de fermer la base, par exemple)."""
+        self.cancel_all()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
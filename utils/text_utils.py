@@ -0,0 +1,25 @@
+# utils/text_utils.py
+import re
+import unicodedata
+
+# Variantes de l'alef/hamza, taa marbuta, alef maqsura et tatweel ramenées à une forme unique,
+# pour que la recherche trouve un nom quelle que soit la façon dont il a été saisi au clavier arabe.
+_ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي', 'ء': '',
+    'ة': 'ه', 'ى': 'ي',
+    'ـ': '',
+})
+
+def normalize_search_text(text):
+    """Normalise un texte pour la recherche : minuscules, sans accents ni harakat, lettres arabes unifiées."""
+    if not text: return ""
+    text = str(text).translate(_ARABIC_FOLDING)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+def build_fts_query(term):
+    """Construit une requête FTS5 de préfixes (tous les mots doivent correspondre). Retourne None si vide."""
+    tokens = re.findall(r'\w+', normalize_search_text(term))
+    if not tokens: return None
+    return ' '.join(f'"{token}"*' for token in tokens)